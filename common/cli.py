@@ -1,4 +1,9 @@
 import argparse
+import sys
+from typing import Iterator, Optional
+
+# Answers piped on stdin, read line by line rather than through input()
+_piped_answers: Optional[Iterator[str]] = None
 
 
 def parse_arguments(script_name: str) -> argparse.ArgumentParser:
@@ -39,4 +44,47 @@ def parse_arguments(script_name: str) -> argparse.ArgumentParser:
         default=".",
         help="Directory to store index database (default: current directory)",
     )
+    index_group = parser.add_mutually_exclusive_group()
+    index_group.add_argument(
+        "--use-existing-index",
+        dest="use_existing_index",
+        action="store_const",
+        const=True,
+        help="Reuse an existing index without prompting",
+    )
+    index_group.add_argument(
+        "--no-use-existing-index",
+        dest="use_existing_index",
+        action="store_const",
+        const=False,
+        help="Rebuild an existing index without prompting",
+    )
     return parser
+
+
+def read_answer(prompt: str) -> str:
+    """Reads the user's answer to a prompt.
+
+    Terminals go through input(). Answers piped on stdin (e.g. replayed from
+    a file) are read from its buffered line iterator instead, and the prompt
+    is written without flushing stdout for every answer.
+
+    Args:
+        prompt (str): The prompt to display.
+
+    Returns:
+        str: The answer, without surrounding whitespace.
+
+    Raises:
+        EOFError: If the piped input has no answer left.
+    """
+    global _piped_answers
+    if sys.stdin.isatty():
+        return input(prompt).strip()
+    if _piped_answers is None:
+        _piped_answers = iter(sys.stdin)
+    sys.stdout.write(prompt)
+    try:
+        return next(_piped_answers).strip()
+    except StopIteration:
+        raise EOFError("No answer left on standard input") from None
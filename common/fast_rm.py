@@ -0,0 +1,148 @@
+import atexit
+import errno
+import logging
+import os
+import queue
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+# Number of threads removing subtrees in parallel
+MAX_WORKERS = 8
+# Name of the directory where discarded trees wait to be deleted
+TRASH_DIR_NAME = ".pystou-trash"
+# Whether entries can be listed and removed relative to an open directory
+SUPPORTS_DIR_FD = os.scandir in os.supports_fd and os.unlink in os.supports_dir_fd
+
+
+def fast_rmtree(path: Union[str, Path], max_workers: int = MAX_WORKERS) -> None:
+    """Deletes a directory tree, removing its subdirectories in parallel.
+
+    Files at the top of the tree are unlinked relative to the open directory,
+    then each subdirectory is handed to shutil.rmtree on a thread pool: unlink
+    and rmdir release the GIL, and sibling trees do not contend in the kernel.
+    Falls back to a plain shutil.rmtree where directory descriptors are not
+    supported.
+
+    Args:
+        path (Union[str, Path]): Directory to delete.
+        max_workers (int): Maximum number of threads removing subtrees.
+    """
+    path = os.fspath(path)
+    if not SUPPORTS_DIR_FD or os.path.islink(path):
+        # Let shutil.rmtree handle (and refuse) symlinks the usual way
+        shutil.rmtree(path)
+        return
+    subdirs: List[str] = []
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW)
+    try:
+        with os.scandir(fd) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(os.path.join(path, entry.name))
+                else:
+                    os.unlink(entry.name, dir_fd=fd)
+    finally:
+        os.close(fd)
+    if len(subdirs) > 1 and max_workers > 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(subdirs))) as executor:
+            futures = [executor.submit(shutil.rmtree, subdir) for subdir in subdirs]
+        for future in futures:
+            future.result()
+    else:
+        for subdir in subdirs:
+            shutil.rmtree(subdir)
+    os.rmdir(path)
+
+
+class Trash:
+    """Directory where trees are renamed to, then deleted in the background.
+
+    Renaming a tree is a single syscall, so callers can move on while a
+    background thread deletes it. Trees left in the trash are deleted before
+    the interpreter exits.
+    """
+
+    def __init__(self, trash_dir: Union[str, Path]):
+        """Initializes the trash, creating its directory on first use.
+
+        Args:
+            trash_dir (Union[str, Path]): Directory to rename trees into.
+        """
+        self.trash_dir = os.fspath(trash_dir)
+        self._queue: "queue.SimpleQueue[Optional[Tuple[str, str]]]" = (
+            queue.SimpleQueue()
+        )
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def discard(self, path: Union[str, Path]) -> None:
+        """Moves a directory tree to the trash to be deleted in the background.
+
+        Falls back to deleting the tree in place when it is not on the same
+        filesystem as the trash.
+
+        Args:
+            path (Union[str, Path]): Directory to delete.
+        """
+        path = os.fspath(path)
+        os.makedirs(self.trash_dir, exist_ok=True)
+        target = os.path.join(self.trash_dir, uuid.uuid4().hex)
+        try:
+            os.rename(path, target)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            fast_rmtree(path)
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._drain, daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+            self._queue.put((path, target))
+
+    def close(self) -> None:
+        """Waits for the trees in the trash to be deleted, then removes it."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            atexit.unregister(self.close)
+            self._queue.put(None)
+            thread.join()
+        # The directory is also created when every rename fails across devices
+        try:
+            os.rmdir(self.trash_dir)
+        except OSError:
+            pass
+
+    def _drain(self) -> None:
+        """Deletes the trees put in the trash until close is called."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            path, target = item
+            try:
+                fast_rmtree(target)
+                logging.info(
+                    {
+                        "action": "delete",
+                        "status": "purged",
+                        "directory": path,
+                        "trash": target,
+                    }
+                )
+            except Exception as e:
+                logging.error(
+                    {
+                        "action": "delete",
+                        "status": "error",
+                        "directory": path,
+                        "trash": target,
+                        "error": str(e),
+                    }
+                )
@@ -1,8 +1,96 @@
 import os
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import logging
+import queue
 import sqlite3
-from typing import List, Optional, Tuple
+import threading
+import time
+from dataclasses import dataclass
+from typing import Deque, Iterator, List, Optional, Tuple, Union
+
+from common.indexer import (
+    DELETE_SUBTREE_FILES_SQL,
+    INSERT_DIRECTORY_SQL,
+    INSERT_FILE_SQL,
+    get_base_name,
+)
+
+# Number of buffered rows that triggers a flush to the database
+BATCH_SIZE = 10_000
+# Subdirectory count above which subtrees are walked in parallel
+PARALLEL_THRESHOLD = 4
+# Number of threads walking subtrees in parallel. The walk mostly waits on
+# readdir/stat, so it uses a few more threads than cores, as ThreadPoolExecutor
+# does by default.
+MAX_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+# Rows handed from a worker thread to the writer at a time
+CHUNK_SIZE = 1_000
+# Maximum number of chunks waiting for the writer
+QUEUE_SIZE = 64
+# Whether directories can be listed from a file descriptor (POSIX only)
+SCANDIR_SUPPORTS_FD = os.scandir in os.supports_fd
+# Minimum delay in seconds between two live output refreshes
+LIVE_OUTPUT_INTERVAL = 0.1
+
+# Monotonic time of the last live output refresh
+_last_print = [0.0]
+
+
+@dataclass
+class ScanCounter:
+    """Running totals of the entries found during a scan.
+
+    Attributes:
+        directories (int): Number of directories scanned.
+        files (int): Number of files scanned.
+    """
+
+    directories: int = 0
+    files: int = 0
+
+
+class EntryBatcher:
+    """Buffers directory and file rows and inserts them in large batches.
+
+    Attributes:
+        conn (sqlite3.Connection): SQLite database connection.
+        batch_size (int): Number of buffered rows that triggers a flush.
+        dir_entries (Deque[Tuple[str, str, float, str]]): Pending directory rows.
+        file_entries (Deque[Tuple[str, str, int, float]]): Pending file rows.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, batch_size: int = BATCH_SIZE):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.dir_entries: Deque[Tuple[str, str, float, str]] = deque()
+        self.file_entries: Deque[Tuple[str, str, int, float]] = deque()
+
+    def add_directory(self, entry: Tuple[str, str, float, str]) -> None:
+        """Buffers a directory row, flushing if the buffer is full.
+
+        Args:
+            entry (Tuple[str, str, float, str]): Path, parent path, mtime and base name.
+        """
+        self.dir_entries.append(entry)
+        if len(self.dir_entries) >= self.batch_size:
+            self.flush()
+
+    def add_file(self, entry: Tuple[str, str, int, float]) -> None:
+        """Buffers a file row, flushing if the buffer is full.
+
+        Args:
+            entry (Tuple[str, str, int, float]): Directory path, name, size and mtime.
+        """
+        self.file_entries.append(entry)
+        if len(self.file_entries) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Inserts all buffered rows into the database."""
+        insert_entries(self.conn, self.dir_entries, self.file_entries)
 
 
 def collect_directories(
@@ -19,10 +107,47 @@ def collect_directories(
         recursive (bool): Whether to scan directories recursively.
         level (Optional[int]): Maximum depth level for recursion (default: unlimited).
     """
-    dir_count = 0  # Directory counter
-    file_count = 0  # File counter
-    clear_database(conn)
-    scan_dir(Path(directory), 1, conn, recursive, level, dir_count, file_count)
+    counter = ScanCounter()
+    # Run the whole scan in a single transaction so the index is written
+    # (and synced) once instead of once per directory.
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+    try:
+        clear_database(conn)
+        batcher = EntryBatcher(conn)
+        scan_dir(Path(directory), 1, batcher, recursive, level, counter)
+        batcher.flush()
+        update_live_output(counter, force=True)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def refresh_directory(
+    conn: sqlite3.Connection, directory: Union[str, Path], recursive: bool
+) -> None:
+    """Scans a directory again and updates its part of the index in place.
+
+    Unlike collect_directories, the rest of the index is left untouched and
+    nothing is committed, so that the caller controls the transaction.
+
+    Args:
+        conn (sqlite3.Connection): SQLite database connection.
+        directory (str or Path): Directory to scan again.
+        recursive (bool): Whether to scan its subdirectories too.
+    """
+    # Indexed files are dropped and listed again, while directories are only
+    # added: INSERT OR IGNORE keeps the rows of those already indexed
+    if recursive:
+        conn.execute(DELETE_SUBTREE_FILES_SQL, (os.fspath(directory),))
+    else:
+        conn.execute(
+            "DELETE FROM files WHERE directory_path = ?", (os.fspath(directory),)
+        )
+    batcher = EntryBatcher(conn)
+    scan_dir(Path(directory), 1, batcher, recursive, None, ScanCounter())
+    batcher.flush()
 
 
 def clear_database(conn: sqlite3.Connection) -> None:
@@ -34,73 +159,223 @@ def clear_database(conn: sqlite3.Connection) -> None:
     cursor = conn.cursor()
     cursor.execute("DELETE FROM directories")
     cursor.execute("DELETE FROM files")
-    conn.commit()
 
 
 def scan_dir(
     current_dir: Path,
     current_level: int,
-    conn: sqlite3.Connection,
+    batcher: EntryBatcher,
     recursive: bool,
     level: Optional[int],
-    dir_count: int,
-    file_count: int,
+    counter: ScanCounter,
 ) -> None:
-    """Recursively scans directories and updates the database.
+    """Scans directories and updates the database.
 
     Args:
-        current_dir (Path): Current directory being scanned.
-        current_level (int): Current depth level.
-        conn (sqlite3.Connection): SQLite database connection.
+        current_dir (Path): Directory to start scanning from.
+        current_level (int): Depth level of the starting directory.
+        batcher (EntryBatcher): Buffer collecting rows to insert.
         recursive (bool): Whether to scan directories recursively.
         level (Optional[int]): Maximum depth level for recursion.
-        dir_count (int): Counter for directories scanned.
-        file_count (int): Counter for files scanned.
+        counter (ScanCounter): Running totals, updated in place.
     """
-    try:
-        with os.scandir(current_dir) as entries:
-            dir_entries: List[Tuple[str, str, float]] = []
-            file_entries: List[Tuple[str, str, int, float]] = []
-            for entry in entries:
-                full_path = Path(entry.path)
-                if entry.is_dir(follow_symlinks=False):
-                    mtime = entry.stat(follow_symlinks=False).st_mtime
-                    dir_entries.append((str(full_path), str(current_dir), mtime))
-                    dir_count += 1
-                    update_live_output(dir_count, file_count)
-                    if recursive and (level is None or current_level < level):
-                        scan_dir(
-                            full_path,
-                            current_level + 1,
-                            conn,
-                            recursive,
-                            level,
-                            dir_count,
-                            file_count,
+    for is_dir, row in iter_entries(current_dir, current_level, recursive, level):
+        if is_dir:
+            batcher.add_directory(row)
+            counter.directories += 1
+        else:
+            batcher.add_file(row)
+            counter.files += 1
+        update_live_output(counter)
+
+
+def iter_entries(
+    current_dir: Union[str, Path],
+    current_level: int,
+    recursive: bool,
+    level: Optional[int],
+) -> Iterator[Tuple[bool, tuple]]:
+    """Yields the rows to index for a directory tree.
+
+    The starting directory is listed first. When it has more than
+    PARALLEL_THRESHOLD subdirectories, each of their subtrees is walked on a
+    worker thread; otherwise the walk stays on the calling thread.
+
+    Args:
+        current_dir (str or Path): Directory to start scanning from.
+        current_level (int): Depth level of the starting directory.
+        recursive (bool): Whether to scan directories recursively.
+        level (Optional[int]): Maximum depth level for recursion.
+
+    Yields:
+        Tuple[bool, tuple]: Whether the row is a directory, and the row itself.
+    """
+    subdirs: List[str] = []
+    for is_dir, row in walk_tree(current_dir, current_level, False, level):
+        if is_dir:
+            subdirs.append(row[0])
+        yield is_dir, row
+    if not recursive or (level is not None and current_level >= level):
+        return
+    if len(subdirs) > PARALLEL_THRESHOLD:
+        yield from _iter_entries_parallel(subdirs, current_level + 1, level)
+    else:
+        for subdir in subdirs:
+            yield from walk_tree(subdir, current_level + 1, recursive, level)
+
+
+def _iter_entries_parallel(
+    subdirs: List[str], subdir_level: int, level: Optional[int]
+) -> Iterator[Tuple[bool, tuple]]:
+    """Walks each subdirectory on a thread pool and yields the collected rows.
+
+    Workers only read the filesystem; rows are handed back in chunks through
+    a bounded queue so that the database is still written by a single thread.
+
+    Args:
+        subdirs (List[str]): Subdirectories to walk.
+        subdir_level (int): Depth level of the subdirectories.
+        level (Optional[int]): Maximum depth level for recursion.
+
+    Yields:
+        Tuple[bool, tuple]: Whether the row is a directory, and the row itself.
+    """
+    chunks: "queue.Queue[Optional[list]]" = queue.Queue(maxsize=QUEUE_SIZE)
+    stop = threading.Event()
+
+    def put(chunk: Optional[list]) -> None:
+        while not stop.is_set():
+            try:
+                chunks.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def walk(subdir: str) -> None:
+        try:
+            chunk = []
+            for item in walk_tree(subdir, subdir_level, True, level):
+                chunk.append(item)
+                if len(chunk) >= CHUNK_SIZE:
+                    put(chunk)
+                    chunk = []
+                    if stop.is_set():
+                        return
+            put(chunk)
+        finally:
+            put(None)
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = [executor.submit(walk, subdir) for subdir in subdirs]
+        try:
+            remaining = len(futures)
+            while remaining:
+                chunk = chunks.get()
+                if chunk is None:
+                    remaining -= 1
+                else:
+                    yield from chunk
+        finally:
+            stop.set()
+    for future in futures:
+        future.result()
+
+
+def walk_tree(
+    current_dir: Union[str, Path],
+    current_level: int,
+    recursive: bool,
+    level: Optional[int],
+) -> Iterator[Tuple[bool, tuple]]:
+    """Walks a directory tree depth-first and yields the rows to index.
+
+    The walk uses an explicit stack rather than recursion so that deep trees
+    cannot exhaust the interpreter's recursion limit. Paths are handled as
+    plain strings as returned by os.scandir to avoid building Path objects.
+
+    Args:
+        current_dir (str or Path): Directory to start scanning from.
+        current_level (int): Depth level of the starting directory.
+        recursive (bool): Whether to scan directories recursively.
+        level (Optional[int]): Maximum depth level for recursion.
+
+    Yields:
+        Tuple[bool, tuple]: Whether the row is a directory, and the row itself.
+    """
+    stack = deque([(os.fspath(current_dir), current_level)])
+    while stack:
+        parent_str, current_level = stack.pop()
+        descend = recursive and (level is None or current_level < level)
+        try:
+            # Entries of "." are stored as bare names, like pathlib does
+            prefix = "" if parent_str == os.curdir else os.path.join(parent_str, "")
+            with scan_directory(parent_str) as entries:
+                for entry in entries:
+                    full_path_str = prefix + entry.name
+                    # is_dir/is_file are answered from the cached d_type,
+                    # so only one stat() is issued per entry.
+                    if entry.is_dir(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        yield (
+                            True,
+                            (
+                                full_path_str,
+                                parent_str,
+                                st.st_mtime,
+                                get_base_name(entry.name),
+                            ),
                         )
-                elif entry.is_file(follow_symlinks=False):
-                    mtime = entry.stat(follow_symlinks=False).st_mtime
-                    size = entry.stat(follow_symlinks=False).st_size
-                    file_entries.append((str(current_dir), entry.name, size, mtime))
-                    file_count += 1
-                    update_live_output(dir_count, file_count)
-            insert_entries(conn, dir_entries, file_entries)
-    except PermissionError as e:
-        print(f"Permission denied: {current_dir}")
-        logging.error(
-            {"action": "scan_error", "directory": str(current_dir), "error": str(e)}
-        )
+                        if descend:
+                            stack.append((full_path_str, current_level + 1))
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        yield False, (parent_str, entry.name, st.st_size, st.st_mtime)
+        except PermissionError as e:
+            print(f"Permission denied: {parent_str}")
+            logging.error(
+                {"action": "scan_error", "directory": parent_str, "error": str(e)}
+            )
+
+
+@contextmanager
+def scan_directory(path: str) -> Iterator[Iterator[os.DirEntry]]:
+    """Lists a directory, through a file descriptor where the platform allows.
+
+    When os.scandir accepts a descriptor, each DirEntry.stat() becomes an
+    fstatat() relative to the open directory, so the kernel does not resolve
+    the full path again for every entry. Entry paths are then bare names.
+
+    Args:
+        path (str): Directory to list.
+
+    Yields:
+        Iterator[os.DirEntry]: The directory entries.
+    """
+    if not SCANDIR_SUPPORTS_FD:
+        with os.scandir(path) as entries:
+            yield entries
+        return
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+    try:
+        with os.scandir(fd) as entries:
+            yield entries
+    finally:
+        os.close(fd)
 
 
-def update_live_output(dir_count: int, file_count: int) -> None:
-    """Updates the live scanning output.
+def update_live_output(counter: ScanCounter, force: bool = False) -> None:
+    """Updates the live scanning output, at most every LIVE_OUTPUT_INTERVAL.
 
     Args:
-        dir_count (int): Number of directories scanned.
-        file_count (int): Number of files scanned.
+        counter (ScanCounter): Running totals to display.
+        force (bool): Whether to refresh regardless of the interval.
     """
-    formatted_dir_count = f"{dir_count:,}"
-    formatted_file_count = f"{file_count:,}"
+    now = time.monotonic()
+    if not force and now - _last_print[0] < LIVE_OUTPUT_INTERVAL:
+        return
+    _last_print[0] = now
+    formatted_dir_count = f"{counter.directories:,}"
+    formatted_file_count = f"{counter.files:,}"
     print(
         f"Scanning directories: {formatted_dir_count}, files: {formatted_file_count}",
         end="\r",
@@ -110,25 +385,33 @@ def update_live_output(dir_count: int, file_count: int) -> None:
 
 def insert_entries(
     conn: sqlite3.Connection,
-    dir_entries: List[Tuple[str, str, float]],
-    file_entries: List[Tuple[str, str, int, float]],
+    dir_entries: Deque[Tuple[str, str, float, str]],
+    file_entries: Deque[Tuple[str, str, int, float]],
 ) -> None:
-    """Inserts directory and file entries into the database.
+    """Inserts directory and file entries into the database, emptying the queues.
+
+    Rows are streamed to executemany as they are popped, so they are released
+    as soon as SQLite has bound them.
 
     Args:
         conn (sqlite3.Connection): SQLite database connection.
-        dir_entries (List[Tuple[str, str, float]]): List of directory entries.
-        file_entries (List[Tuple[str, str, int, float]]): List of file entries.
+        dir_entries (Deque[Tuple[str, str, float, str]]): Queue of directory entries.
+        file_entries (Deque[Tuple[str, str, int, float]]): Queue of file entries.
     """
     cursor = conn.cursor()
     if dir_entries:
-        cursor.executemany(
-            "INSERT OR IGNORE INTO directories (path, parent_path, mtime) VALUES (?, ?, ?)",
-            dir_entries,
-        )
+        cursor.executemany(INSERT_DIRECTORY_SQL, _drain(dir_entries))
     if file_entries:
-        cursor.executemany(
-            "INSERT OR IGNORE INTO files (directory_path, name, size, mtime) VALUES (?, ?, ?, ?)",
-            file_entries,
-        )
-    conn.commit()
+        cursor.executemany(INSERT_FILE_SQL, _drain(file_entries))
+
+
+def _drain(entries: Deque[tuple]) -> Iterator[tuple]:
+    """Pops every entry currently in the queue, oldest first.
+
+    Args:
+        entries (Deque[tuple]): Queue to empty.
+
+    Returns:
+        Iterator[tuple]: Lazy iterator over the popped entries.
+    """
+    return (entries.popleft() for _ in range(len(entries)))
@@ -1,8 +1,72 @@
 import sqlite3
 import logging
 import os
+import re
+import stat
+import sys
+from itertools import groupby
+from operator import itemgetter
 from pathlib import Path
-from typing import List
+from typing import Iterable, List, Tuple, Union
+
+# Splits a directory name into its base name and optional " (n)" suffix
+DUPLICATE_NAME_PATTERN = re.compile(r"^(.*?)(?: \((\d+)\))?$")
+
+# Walks the parent_path links down from a directory to collect its subtree
+_SUBTREE_CTE = """
+    WITH RECURSIVE subtree(path) AS (
+        VALUES(?)
+        UNION ALL
+        SELECT d.path FROM directories d JOIN subtree ON d.parent_path = subtree.path
+    )
+"""
+DELETE_SUBTREE_FILES_SQL = (
+    _SUBTREE_CTE + "DELETE FROM files WHERE directory_path IN subtree"
+)
+DELETE_SUBTREE_DIRECTORIES_SQL = (
+    _SUBTREE_CTE + "DELETE FROM directories WHERE path IN subtree"
+)
+# Moves a directory subtree to a new path, given as :old and :new. Files go
+# first since the subtree is resolved from the directories.
+_RENAMED_SUBTREE_CTE = """
+    WITH RECURSIVE subtree(path) AS (
+        VALUES(:old)
+        UNION ALL
+        SELECT d.path FROM directories d JOIN subtree ON d.parent_path = subtree.path
+    )
+"""
+RENAME_SUBTREE_FILES_SQL = (
+    _RENAMED_SUBTREE_CTE
+    + """
+    UPDATE files
+    SET directory_path = :new || substr(directory_path, length(:old) + 1)
+    WHERE directory_path IN subtree
+"""
+)
+RENAME_SUBTREE_DIRECTORIES_SQL = (
+    _RENAMED_SUBTREE_CTE
+    + """
+    UPDATE OR REPLACE directories
+    SET path = :new || substr(path, length(:old) + 1),
+        parent_path = CASE WHEN path = :old THEN :new_parent
+            ELSE :new || substr(parent_path, length(:old) + 1) END,
+        base_name = CASE WHEN path = :old THEN :new_base_name ELSE base_name END
+    WHERE path IN subtree
+"""
+)
+# Statements are kept as constants so that sqlite3's statement cache, keyed on
+# the SQL text, reuses their prepared form across calls
+DELETE_FILE_SQL = "DELETE FROM files WHERE directory_path = ? AND name = ?"
+INSERT_DIRECTORY_SQL = (
+    "INSERT OR IGNORE INTO directories (path, parent_path, mtime, base_name)"
+    " VALUES (?, ?, ?, ?)"
+)
+INSERT_FILE_SQL = (
+    "INSERT OR IGNORE INTO files (directory_path, name, size, mtime)"
+    " VALUES (?, ?, ?, ?)"
+)
+# Size of the memory map used to read the database file (1 GiB)
+MMAP_SIZE = 1 << 30
 
 
 def initialize_database(
@@ -19,10 +83,27 @@ def initialize_database(
     """
     db_path = os.path.join(db_dir, db_name)
     conn = sqlite3.connect(db_path)
+    configure_connection(conn)
     create_tables(conn)
     return conn
 
 
+def configure_connection(conn: sqlite3.Connection) -> None:
+    """Tunes the connection for bulk writes.
+
+    WAL journaling with ``synchronous=NORMAL`` only syncs on checkpoints, so
+    large scans are no longer bound by one fsync per transaction.
+
+    Args:
+        conn (sqlite3.Connection): SQLite database connection.
+    """
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA cache_size=-65536")
+
+
 def create_tables(conn: sqlite3.Connection) -> None:
     """Creates necessary tables in the database.
 
@@ -36,10 +117,12 @@ def create_tables(conn: sqlite3.Connection) -> None:
             id INTEGER PRIMARY KEY,
             path TEXT UNIQUE,
             parent_path TEXT,
-            mtime REAL
+            mtime REAL,
+            base_name TEXT
         )
     """
     )
+    migrate_directories_base_name(conn)
     cursor.execute(
         """
         CREATE TABLE IF NOT EXISTS files (
@@ -51,15 +134,66 @@ def create_tables(conn: sqlite3.Connection) -> None:
         )
     """
     )
+    # Covering index for the duplicate grouping: the (parent_path, base_name)
+    # groups are read in order and their paths come from the index alone
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_dirs_parent_base_path"
+        " ON directories(parent_path, base_name, path)"
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_dir ON files(directory_path)")
     conn.commit()
 
 
-def prompt_use_existing_index() -> bool:
+def migrate_directories_base_name(conn: sqlite3.Connection) -> None:
+    """Adds and fills the base_name column in indexes created without it.
+
+    Args:
+        conn (sqlite3.Connection): SQLite database connection.
+    """
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(directories)")
+    if any(column[1] == "base_name" for column in cursor.fetchall()):
+        return
+    cursor.execute("ALTER TABLE directories ADD COLUMN base_name TEXT")
+    cursor.execute("SELECT id, path FROM directories")
+    cursor.executemany(
+        "UPDATE directories SET base_name = ? WHERE id = ?",
+        [(get_base_name(Path(path).name), id_) for id_, path in cursor.fetchall()],
+    )
+
+
+def get_base_name(dir_name: str) -> str:
+    """Returns a directory name without its duplicate " (n)" suffix.
+
+    Args:
+        dir_name (str): Name of the directory.
+
+    Returns:
+        str: The base name shared by the directory and its duplicates.
+    """
+    # Most names carry no suffix; skip the regex for them
+    if not dir_name.endswith(")"):
+        return dir_name
+    return DUPLICATE_NAME_PATTERN.match(dir_name).group(1)
+
+
+def prompt_use_existing_index(args=None) -> bool:
     """Prompts the user to decide whether to use the existing index.
 
+    The prompt is skipped when the choice was given on the command line, and
+    the existing index is used when stdin is not a terminal.
+
+    Args:
+        args: Parsed command-line arguments, if any.
+
     Returns:
         bool: True if the user wants to use the existing index, False otherwise.
     """
+    use_existing_index = getattr(args, "use_existing_index", None)
+    if use_existing_index is not None:
+        return use_existing_index
+    if not sys.stdin.isatty():
+        return True
     while True:
         choice = (
             input(
@@ -85,40 +219,98 @@ def update_index_after_change(
         action (str): The action performed ('delete_file', 'delete_directory', 'add_file', 'add_directory').
         path (Path): Path of the file or directory affected.
     """
-    cursor = conn.cursor()
-    if action == "delete_file":
-        cursor.execute(
-            "DELETE FROM files WHERE directory_path = ? AND name = ?",
-            (str(path.parent), path.name),
-        )
-    elif action == "delete_directory":
-        # Delete directory entry and all files under it
-        cursor.execute("DELETE FROM directories WHERE path = ?", (str(path),))
-        cursor.execute("DELETE FROM files WHERE directory_path = ?", (str(path),))
-        # Optionally, delete subdirectories recursively if they were indexed
-        cursor.execute(
-            "DELETE FROM directories WHERE parent_path LIKE ?", (str(path) + "%",)
-        )
-        cursor.execute(
-            "DELETE FROM files WHERE directory_path LIKE ?", (str(path) + "%",)
-        )
-    elif action == "add_file":
-        mtime = path.stat().st_mtime
-        size = path.stat().st_size
-        cursor.execute(
-            "INSERT OR IGNORE INTO files (directory_path, name, size, mtime) VALUES (?, ?, ?, ?)",
-            (str(path.parent), path.name, size, mtime),
-        )
-    elif action == "add_directory":
-        mtime = path.stat().st_mtime
-        parent_path = str(path.parent)
-        cursor.execute(
-            "INSERT OR IGNORE INTO directories (path, parent_path, mtime) VALUES (?, ?, ?)",
-            (str(path), parent_path, mtime),
-        )
+    update_index_after_changes(conn, [(action, path)])
     conn.commit()
 
 
+def update_index_after_changes(
+    conn: sqlite3.Connection,
+    changes: Iterable[Tuple[str, Union[Path, Tuple[Path, Path]]]],
+) -> None:
+    """Updates the index after several files/directories are changed.
+
+    Consecutive changes of the same kind are written with one executemany call.
+    Nothing is committed, so the caller controls the transaction.
+
+    Args:
+        conn (sqlite3.Connection): SQLite database connection.
+        changes (Iterable[Tuple[str, Union[Path, Tuple[Path, Path]]]]): Pairs of
+            action performed (as for update_index_after_change) and path
+            affected, in order. A 'rename_directory' action takes the old and
+            new paths of the directory instead.
+    """
+    cursor = conn.cursor()
+    for action, group in groupby(changes, key=itemgetter(0)):
+        paths = [path for _, path in group]
+        if action == "delete_file":
+            cursor.executemany(
+                DELETE_FILE_SQL, [(str(path.parent), path.name) for path in paths]
+            )
+        elif action == "delete_directory":
+            # Delete the directories, their indexed subdirectories and all their
+            # files. Files go first since the subtree is resolved from the
+            # directories.
+            params = [(str(path),) for path in paths]
+            cursor.executemany(DELETE_SUBTREE_FILES_SQL, params)
+            cursor.executemany(DELETE_SUBTREE_DIRECTORIES_SQL, params)
+        elif action == "add_file":
+            rows = []
+            for path in paths:
+                try:
+                    st = os.stat(path, follow_symlinks=False)
+                except FileNotFoundError:
+                    # Gone since it was changed, there is nothing to index
+                    continue
+                # Only regular files are indexed, as when scanning
+                if stat.S_ISREG(st.st_mode):
+                    rows.append((str(path.parent), path.name, st.st_size, st.st_mtime))
+            cursor.executemany(INSERT_FILE_SQL, rows)
+        elif action == "add_directory":
+            cursor.executemany(
+                INSERT_DIRECTORY_SQL,
+                [
+                    (
+                        str(path),
+                        str(path.parent),
+                        path.stat().st_mtime,
+                        get_base_name(path.name),
+                    )
+                    for path in paths
+                ],
+            )
+        elif action == "rename_directory":
+            params = [
+                {
+                    "old": str(old_path),
+                    "new": str(new_path),
+                    "new_parent": str(new_path.parent),
+                    "new_base_name": get_base_name(new_path.name),
+                }
+                for old_path, new_path in paths
+            ]
+            cursor.executemany(RENAME_SUBTREE_FILES_SQL, params)
+            cursor.executemany(RENAME_SUBTREE_DIRECTORIES_SQL, params)
+
+
+def index_exists(conn: sqlite3.Connection) -> bool:
+    """Checks whether the database already holds an index.
+
+    The database file itself is created when the connection is opened, so
+    this looks for indexed entries instead of checking the file.
+
+    Args:
+        conn (sqlite3.Connection): SQLite database connection.
+
+    Returns:
+        bool: True if at least one directory or file is indexed.
+    """
+    # A flat directory is indexed as files only
+    cursor = conn.execute(
+        "SELECT EXISTS (SELECT 1 FROM directories) OR EXISTS (SELECT 1 FROM files)"
+    )
+    return bool(cursor.fetchone()[0])
+
+
 def load_directories_from_index(conn: sqlite3.Connection) -> List[Path]:
     """Loads directory paths from the database.
 
@@ -134,11 +326,25 @@ def load_directories_from_index(conn: sqlite3.Connection) -> List[Path]:
     return directories
 
 
+def count_directories(conn: sqlite3.Connection) -> int:
+    """Counts the directories in the index without loading them.
+
+    Args:
+        conn (sqlite3.Connection): SQLite database connection.
+
+    Returns:
+        int: Number of indexed directories.
+    """
+    cursor = conn.execute("SELECT COUNT(*) FROM directories")
+    return cursor.fetchone()[0]
+
+
 def close_database(conn: sqlite3.Connection) -> None:
-    """Closes the database connection.
+    """Commits any pending index update and closes the database connection.
 
     Args:
         conn (sqlite3.Connection): SQLite database connection.
     """
+    conn.commit()
     conn.close()
     logging.info({"action": "database_closed"})
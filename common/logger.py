@@ -1,26 +1,47 @@
 from datetime import datetime
 from logging import handlers
+import atexit
+import copy
 import json
 import logging
 import os
+import queue
+from typing import Set
+
+# Timestamp of this run, shared by every log file it creates
+RUN_TIMESTAMP = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+# Log files already attached to the root logger
+_configured_log_files: Set[str] = set()
 
 
 def setup_logging(script_name: str = "script", log_dir: str = ".") -> None:
-    """Sets up JSON logging to a file with the current timestamp.
+    """Sets up JSON logging to a file named after the run timestamp.
+
+    Records are queued and written to the file by a background listener
+    thread, so logging calls never wait on disk I/O. The listener writes
+    whatever is queued before flushing, so bursts of records share a write.
+    Calling it again for the same file is a no-op.
 
     Args:
         script_name (str): Name of the script (used in log filename).
         log_dir (str): Directory to store log files.
     """
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_filename = os.path.join(log_dir, f"{script_name}.{timestamp}.log")
-    handler = handlers.RotatingFileHandler(
+    log_filename = os.path.join(log_dir, f"{script_name}.{RUN_TIMESTAMP}.log")
+    if log_filename in _configured_log_files:
+        return
+    _configured_log_files.add(log_filename)
+    handler = BufferedRotatingFileHandler(
         log_filename, maxBytes=10485760, backupCount=5
     )
     handler.setFormatter(JsonFormatter())
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    listener = BatchingQueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
-    logger.addHandler(handler)
+    logger.addHandler(StructuredQueueHandler(log_queue))
 
 
 class JsonFormatter(logging.Formatter):
@@ -44,4 +65,65 @@ class JsonFormatter(logging.Formatter):
         }
         if record.exc_info:
             log_record["exception"] = self.formatException(record.exc_info)
-        return json.dumps(log_record)
+        elif record.exc_text:
+            log_record["exception"] = record.exc_text
+        return json.dumps(log_record, separators=(",", ":"), default=str)
+
+
+class BufferedRotatingFileHandler(handlers.RotatingFileHandler):
+    """Rotating file handler that leaves flushing to its queue listener."""
+
+    def flush(self) -> None:
+        """Skips the flush that follows every record; see sync."""
+
+    def sync(self) -> None:
+        """Flushes the records buffered so far to the log file."""
+        super().flush()
+
+
+class BatchingQueueListener(handlers.QueueListener):
+    """Queue listener that syncs its handlers only once the queue is drained."""
+
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        """Dequeues a record, syncing the handlers before waiting for one.
+
+        Args:
+            block (bool): Whether to wait for a record.
+
+        Returns:
+            logging.LogRecord: The next record (or sentinel).
+        """
+        if block and self.queue.empty():
+            for handler in self.handlers:
+                if isinstance(handler, BufferedRotatingFileHandler):
+                    handler.sync()
+        return self.queue.get(block)
+
+
+class StructuredQueueHandler(handlers.QueueHandler):
+    """Queue handler that keeps dict messages intact for JsonFormatter.
+
+    The stock QueueHandler renders the message to a string before enqueuing
+    it, which would turn the structured log entries into their repr.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Prepares a record for queuing, leaving dict messages as they are.
+
+        Args:
+            record (logging.LogRecord): The log record.
+
+        Returns:
+            logging.LogRecord: The record, or a copy of it that can be pickled.
+        """
+        if not isinstance(record.msg, dict):
+            return super().prepare(record)
+        if not record.exc_info:
+            # Nothing needs to change, so the record is queued as is rather
+            # than copied on the calling thread for every message
+            return record
+        record = copy.copy(record)
+        # Tracebacks cannot be pickled, keep their text instead
+        record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
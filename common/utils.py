@@ -1,15 +1,64 @@
+import bz2
+import gzip
+import multiprocessing
 import os
 import re
 import shutil
+import sqlite3
 import subprocess
 import tarfile
 import zipfile
-from collections import defaultdict
-from pathlib import Path
-from typing import Any, List, Union
+from concurrent.futures import ProcessPoolExecutor
+from logging import handlers
+from pathlib import Path, PurePosixPath
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 import logging
 
+from common.indexer import configure_connection
+from common.logger import StructuredQueueHandler
+
+# Duplicate sibling directories, grouped on the covering idx_dirs_parent_base_path
+# index. Paths cannot contain NUL, which makes it a safe separator.
+DUPLICATE_GROUPS_SQL = """
+    SELECT parent_path, base_name, GROUP_CONCAT(path, char(0))
+    FROM directories
+    GROUP BY parent_path, base_name
+    HAVING COUNT(*) > 1
+    ORDER BY parent_path, base_name
+"""
+# Finds a duplicate group in a directory's subtree, given as :directory and the
+# [:prefix, :prefix_end) range of the paths below it
+NESTED_DUPLICATE_GROUP_SQL = """
+    SELECT 1
+    FROM directories
+    WHERE parent_path = :directory
+        OR (parent_path >= :prefix AND parent_path < :prefix_end)
+    GROUP BY parent_path, base_name
+    HAVING COUNT(*) > 1
+    LIMIT 1
+"""
+
+# Chunk size used when copying decompressed streams to disk
+COPY_BUFFER_SIZE = 1 << 20
+
+# Function opening each supported single-file compression format
+COMPRESSED_FILE_OPENERS: Dict[str, Callable[..., IO[bytes]]] = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+}
+
 
 def group_directories(conn) -> dict:
     """Groups duplicate sibling directories based on their base names and parent directories.
@@ -20,27 +69,69 @@ def group_directories(conn) -> dict:
     Returns:
         dict: A dictionary where keys are group keys and values are lists of directory paths.
     """
-    cursor = conn.cursor()
-    pattern = re.compile(r"^(.*?)(?: \((\d+)\))?$")
-    cursor.execute("SELECT path, parent_path FROM directories")
-    groups = defaultdict(list)
-    for path_str, parent_path_str in cursor.fetchall():
-        dir_path = Path(path_str)
-        parent_dir = Path(parent_path_str)
-        dir_name = dir_path.name
-        match = pattern.match(dir_name)
-        if match:
-            base_name = match.group(1)
-            group_key = (str(parent_dir), base_name)
-            groups[group_key].append(dir_path)
-    # Only keep groups with more than one directory
-    duplicate_groups = {k: v for k, v in groups.items() if len(v) > 1}
-    return duplicate_groups
+    return dict(iter_duplicate_groups(conn))
+
+
+def iter_duplicate_groups(conn) -> Iterator[Tuple[Tuple[str, str], List[Path]]]:
+    """Yields duplicate sibling directories group by group, as read from the index.
+
+    The grouping runs in SQLite on the indexed (parent_path, base_name) pair,
+    so only the duplicate groups are read back, one row at a time. Rows are
+    read through a separate connection: the caller may update the index while
+    the groups are consumed, and a statement must not step over rows its own
+    connection is changing. In WAL mode the reader keeps a consistent
+    snapshot of the index as it was when the iteration started.
+
+    Args:
+        conn: SQLite database connection.
+
+    Yields:
+        Tuple[Tuple[str, str], List[Path]]: The group key (parent directory and
+            base name) and the directory paths in the group.
+    """
+    db_file = conn.execute("PRAGMA database_list").fetchone()[2]
+    # In-memory databases cannot be shared, read them in one go instead
+    reader = sqlite3.connect(db_file) if db_file else conn
+    if reader is not conn:
+        configure_connection(reader)
+    try:
+        cursor = reader.cursor()
+        cursor.execute(DUPLICATE_GROUPS_SQL)
+        rows = cursor if db_file else cursor.fetchall()
+        for parent_path, base_name, paths in rows:
+            yield (parent_path, base_name), [Path(path) for path in paths.split("\0")]
+    finally:
+        if reader is not conn:
+            reader.close()
+
+
+def has_nested_duplicate_groups(conn, directory: Path) -> bool:
+    """Checks whether the index holds duplicate groups within a directory.
+
+    Args:
+        conn: SQLite database connection.
+        directory (Path): Path to the directory.
+
+    Returns:
+        bool: True if a group's parent directory is the directory or lies
+            within it.
+    """
+    prefix = os.path.join(str(directory), "")
+    # Paths below the directory sort between its prefix and the prefix with
+    # its trailing separator incremented
+    prefix_end = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    cursor = conn.execute(
+        NESTED_DUPLICATE_GROUP_SQL,
+        {"directory": str(directory), "prefix": prefix, "prefix_end": prefix_end},
+    )
+    return cursor.fetchone() is not None
 
 
 def get_directory_size(conn, dir_path: Path) -> tuple:
     """Calculates the total size and number of files in a directory using the database.
 
+    Files in subdirectories are included.
+
     Args:
         conn: SQLite database connection.
         dir_path (Path): Path to the directory.
@@ -48,12 +139,41 @@ def get_directory_size(conn, dir_path: Path) -> tuple:
     Returns:
         tuple: Total size in bytes and number of files.
     """
+    return get_directory_sizes(conn, [dir_path])[str(dir_path)]
+
+
+def get_directory_sizes(conn, dir_paths: List[Path]) -> dict:
+    """Calculates the total size and number of files of several directories at once.
+
+    Files in subdirectories are included: the subtrees are resolved in SQLite
+    by following the indexed parent_path links, so nothing is read from disk.
+
+    Args:
+        conn: SQLite database connection.
+        dir_paths (List[Path]): Paths to the directories.
+
+    Returns:
+        dict: Total size in bytes and number of files, keyed by directory path.
+    """
+    placeholders = ",".join(["(?)"] * len(dir_paths))
     cursor = conn.cursor()
-    cursor.execute("SELECT size FROM files WHERE directory_path = ?", (str(dir_path),))
-    sizes = cursor.fetchall()
-    total_size = sum(size[0] for size in sizes)
-    num_files = len(sizes)
-    return total_size, num_files
+    cursor.execute(
+        f"""
+        WITH RECURSIVE
+            roots(root) AS (VALUES {placeholders}),
+            subtree(root, path) AS (
+                SELECT root, root FROM roots
+                UNION ALL
+                SELECT subtree.root, d.path
+                FROM directories d JOIN subtree ON d.parent_path = subtree.path
+            )
+        SELECT subtree.root, COALESCE(SUM(f.size), 0), COUNT(f.id)
+        FROM subtree LEFT JOIN files f ON f.directory_path = subtree.path
+        GROUP BY subtree.root
+    """,
+        [str(dir_path) for dir_path in dir_paths],
+    )
+    return {path: (size, num_files) for path, size, num_files in cursor.fetchall()}
 
 
 def summarize_group(group_key, dir_paths: List[Path], conn) -> None:
@@ -66,8 +186,9 @@ def summarize_group(group_key, dir_paths: List[Path], conn) -> None:
     """
     parent_dir, base_name = group_key
     print(f"\nFound duplicate directories in '{parent_dir}': '{base_name}'")
+    sizes = get_directory_sizes(conn, dir_paths)
     for dir_path in sorted(dir_paths):
-        size, num_files = get_directory_size(conn, dir_path)
+        size, num_files = sizes[str(dir_path)]
         formatted_size = f"{size:,}"
         formatted_num_files = f"{num_files:,}"
         print(
@@ -85,36 +206,45 @@ def get_archive_files(directory: Union[str, Path], recursive: bool) -> List[Path
     Returns:
         List[Path]: A list of Paths to archive files.
     """
-    archive_extensions = [
-        ".zip",
-        ".tar",
-        ".tar.gz",
-        ".tgz",
-        ".tar.bz2",
-        ".tbz",
-        ".gz",
-        ".bz2",
-        ".tar.zst",
-        ".tzst",
-        ".zst",
-        ".pst",
-    ]
-    archive_files: List[Path] = []
-    directory_path = Path(directory)
-
-    if recursive:
-        for root, _, files in os.walk(directory_path):
-            for file in files:
-                if any(file.endswith(ext) for ext in archive_extensions):
-                    archive_files.append(Path(root) / file)
-    else:
-        for file in os.listdir(directory_path):
-            file_path = directory_path / file
-            if file_path.is_file() and any(
-                file.endswith(ext) for ext in archive_extensions
-            ):
-                archive_files.append(file_path)
-    return archive_files
+    return list(iter_archive_files(directory, recursive))
+
+
+def iter_archive_files(directory: Union[str, Path], recursive: bool) -> Iterator[Path]:
+    """Yields the archive files in the directory as they are found.
+
+    Args:
+        directory (str or Path): The directory to search for archive files.
+        recursive (bool): Whether to search recursively.
+
+    Yields:
+        Path: The path to an archive file.
+    """
+    root_dir = Path(directory)
+    pending_dirs = [root_dir]
+    while pending_dirs:
+        current_dir = pending_dirs.pop()
+        subdirs = []
+        archive_files = []
+        try:
+            with os.scandir(current_dir) as entries:
+                for entry in entries:
+                    # The d_type cached by scandir answers both checks
+                    if entry.is_dir():
+                        if recursive and not entry.is_symlink():
+                            subdirs.append(Path(entry.path))
+                    elif entry.is_file() and entry.name.endswith(ARCHIVE_EXTS):
+                        archive_files.append(Path(entry.path))
+        except OSError:
+            # Like os.walk, skip subdirectories that cannot be listed
+            if current_dir is root_dir:
+                raise
+            continue
+        # Yield outside of the scandir block so that its handle is released.
+        # The archives of a directory come out together, sorted by name.
+        archive_files.sort()
+        yield from archive_files
+        # Push in reverse so directories are visited in listing order
+        pending_dirs.extend(reversed(subdirs))
 
 
 def extract_archive(archive_path: Path) -> bool:
@@ -127,37 +257,18 @@ def extract_archive(archive_path: Path) -> bool:
         bool: True if extraction was successful, False otherwise.
     """
     try:
-        suffixes = "".join(archive_path.suffixes)
-        if suffixes.endswith(".zip"):
-            return extract_zip_archive(archive_path)
-        elif (
-            suffixes.endswith(".tar.gz")
-            or suffixes.endswith(".tgz")
-            or suffixes.endswith(".tar.bz2")
-            or suffixes.endswith(".tbz")
-            or suffixes.endswith(".tar")
-        ):
-            return extract_tar_archive(archive_path)
-        elif suffixes.endswith(".gz") or suffixes.endswith(".bz2"):
-            return extract_compressed_file(archive_path)
-        elif (
-            suffixes.endswith(".tar.zst")
-            or suffixes.endswith(".tzst")
-            or suffixes.endswith(".zst")
-        ):
-            return extract_zst_archive(archive_path)
-        elif suffixes.endswith(".pst"):
-            return extract_pst_archive(archive_path)
-        else:
-            print(f"Unsupported archive format: {archive_path}")
-            logging.error(
-                {
-                    "action": "extract",
-                    "status": "unsupported_format",
-                    "archive": str(archive_path),
-                }
-            )
-            return False
+        handler = get_archive_handler(archive_path)
+        if handler is not None:
+            return handler(archive_path)
+        print(f"Unsupported archive format: {archive_path}")
+        logging.error(
+            {
+                "action": "extract",
+                "status": "unsupported_format",
+                "archive": str(archive_path),
+            }
+        )
+        return False
     except Exception as e:
         print(f"Error extracting archive {archive_path}: {e}")
         logging.error(
@@ -171,6 +282,112 @@ def extract_archive(archive_path: Path) -> bool:
         return False
 
 
+def extract_all(archives: List[Path], max_workers: Optional[int] = None) -> List[bool]:
+    """Extracts several archives in parallel, one worker process per CPU by default.
+
+    Records logged by the workers are sent back to the handlers of this
+    process's root logger.
+
+    Args:
+        archives (List[Path]): The paths to the archive files.
+        max_workers (Optional[int]): Maximum number of worker processes.
+
+    Returns:
+        List[bool]: Whether each extraction was successful, in input order.
+    """
+    if not archives:
+        return []
+    # Listener threads are already running: forking them could deadlock the
+    # workers, so they are started from a fresh interpreter instead
+    context = multiprocessing.get_context("spawn")
+    log_queue = context.Queue()
+    listener = handlers.QueueListener(
+        log_queue, *logging.getLogger().handlers, respect_handler_level=True
+    )
+    listener.start()
+    try:
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=context,
+            initializer=_init_extract_worker,
+            initargs=(log_queue,),
+        ) as executor:
+            return list(executor.map(extract_archive, archives))
+    finally:
+        listener.stop()
+
+
+def _init_extract_worker(log_queue: "multiprocessing.Queue") -> None:
+    """Routes the logs of an extraction worker process to the parent process.
+
+    Args:
+        log_queue (multiprocessing.Queue): Queue drained by the parent process.
+    """
+    logger = logging.getLogger()
+    logger.handlers = [StructuredQueueHandler(log_queue)]
+    logger.setLevel(logging.INFO)
+
+
+def get_archive_handler(archive_path: Path) -> Optional[Callable[[Path], bool]]:
+    """Returns the extraction function matching the archive's extension.
+
+    Double extensions such as ".tar.gz" take precedence over the last suffix.
+
+    Args:
+        archive_path (Path): The path to the archive file.
+
+    Returns:
+        Optional[Callable[[Path], bool]]: The extraction function, or None if the
+            format is not supported.
+    """
+    suffixes = archive_path.suffixes
+    handler = ARCHIVE_HANDLERS.get("".join(suffixes[-2:]))
+    if handler is None and suffixes:
+        handler = ARCHIVE_HANDLERS.get(suffixes[-1])
+    return handler
+
+
+def get_top_level_names(archive_path: Path) -> Optional[Set[str]]:
+    """Returns the names of the entries an archive extracts into its directory.
+
+    Only the first component of each member path is kept: an archive holding
+    'docs/new.txt' extracts into 'docs', which may already exist. Single
+    compressed files and PST archives only create new entries, so nothing is
+    listed for them.
+
+    Args:
+        archive_path (Path): The path to the archive file.
+
+    Returns:
+        Optional[Set[str]]: The names, or None if they cannot be listed without
+            extracting the archive.
+    """
+    handler = get_archive_handler(archive_path)
+    try:
+        if handler is extract_zip_archive:
+            with zipfile.ZipFile(archive_path, "r") as zip_ref:
+                names = zip_ref.namelist()
+        elif handler is extract_tar_archive:
+            with tarfile.open(archive_path, "r:*") as tar_ref:
+                names = tar_ref.getnames()
+        elif handler is extract_zst_archive and archive_path.name.endswith(
+            (".tar.zst", ".tzst")
+        ):
+            return None
+        else:
+            return set()
+    except Exception:
+        # Extraction reports the error, the caller falls back to a full rescan
+        return None
+    top_level_names = set()
+    for name in names:
+        # Leading slashes and "." components are dropped on extraction
+        parts = [part for part in PurePosixPath(name).parts if part != "/"]
+        if parts:
+            top_level_names.add(parts[0])
+    return top_level_names
+
+
 def extract_zip_archive(archive_path: Path) -> bool:
     """Extracts a ZIP archive.
 
@@ -235,21 +452,8 @@ def extract_compressed_file(archive_path: Path) -> bool:
         bool: True if extraction was successful, False otherwise.
     """
     try:
-        if archive_path.suffix == ".gz":
-            import gzip
-
-            target_path = archive_path.with_suffix("")
-            with gzip.open(archive_path, "rb") as f_in, open(
-                target_path, "wb"
-            ) as f_out:
-                shutil.copyfileobj(f_in, f_out)
-        elif archive_path.suffix == ".bz2":
-            import bz2
-
-            target_path = archive_path.with_suffix("")
-            with bz2.open(archive_path, "rb") as f_in, open(target_path, "wb") as f_out:
-                shutil.copyfileobj(f_in, f_out)
-        else:
+        opener = COMPRESSED_FILE_OPENERS.get(archive_path.suffix)
+        if opener is None:
             print(f"Unsupported compressed file format: {archive_path}")
             logging.error(
                 {
@@ -259,6 +463,9 @@ def extract_compressed_file(archive_path: Path) -> bool:
                 }
             )
             return False
+        target_path = archive_path.with_suffix("")
+        with opener(archive_path, "rb") as f_in, open(target_path, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out, length=COPY_BUFFER_SIZE)
         print(f"Extracted compressed file: {archive_path}")
         return True
     except Exception as e:
@@ -317,24 +524,22 @@ def _extract_zst_with_module(archive_path: Path, zstd: Any) -> bool:
         bool: True if extraction was successful, False otherwise.
     """
     try:
-        if ".tar.zst" in "".join(archive_path.suffixes) or ".tzst" in "".join(
-            archive_path.suffixes
-        ):
-            # Extract TAR.ZST archive
-            temp_tar_path = archive_path.with_suffix(".tar")
-            with open(archive_path, "rb") as f_in, open(temp_tar_path, "wb") as f_out:
+        suffixes = "".join(archive_path.suffixes)
+        if ".tar.zst" in suffixes or ".tzst" in suffixes:
+            # Extract TAR.ZST archive, streaming the decompressed TAR
+            with open(archive_path, "rb") as f_in:
                 dctx = zstd.ZstdDecompressor()
-                dctx.copy_stream(f_in, f_out)
-            with tarfile.open(temp_tar_path, "r") as tar_ref:
-                tar_ref.extractall(archive_path.parent)
-            temp_tar_path.unlink()
+                with dctx.stream_reader(f_in) as reader:
+                    with tarfile.open(fileobj=reader, mode="r|") as tar_ref:
+                        tar_ref.extractall(archive_path.parent)
             print(f"Extracted TAR.ZST archive: {archive_path}")
         else:
             # Decompress .zst file
             target_path = archive_path.with_suffix("")
             with open(archive_path, "rb") as f_in, open(target_path, "wb") as f_out:
                 dctx = zstd.ZstdDecompressor()
-                dctx.copy_stream(f_in, f_out)
+                with dctx.stream_reader(f_in) as reader:
+                    shutil.copyfileobj(reader, f_out, length=COPY_BUFFER_SIZE)
             print(f"Decompressed ZST file: {archive_path}")
         return True
     except Exception as e:
@@ -360,18 +565,20 @@ def _extract_zst_with_command(archive_path: Path) -> bool:
         bool: True if extraction was successful, False otherwise.
     """
     try:
-        cmd = ["zstd", "-d", str(archive_path), "-o", str(archive_path.with_suffix(""))]
-        subprocess.run(cmd, check=True)
-        if ".tar.zst" in "".join(archive_path.suffixes) or ".tzst" in "".join(
-            archive_path.suffixes
-        ):
-            # Extract the resulting .tar file
-            temp_tar_path = archive_path.with_suffix(".tar")
-            with tarfile.open(temp_tar_path, "r") as tar_ref:
-                tar_ref.extractall(archive_path.parent)
-            temp_tar_path.unlink()
+        suffixes = "".join(archive_path.suffixes)
+        if ".tar.zst" in suffixes or ".tzst" in suffixes:
+            # Extract the TAR streamed on the command's standard output
+            cmd = ["zstd", "-d", "-c", str(archive_path)]
+            with subprocess.Popen(cmd, stdout=subprocess.PIPE) as process:
+                with tarfile.open(fileobj=process.stdout, mode="r|") as tar_ref:
+                    tar_ref.extractall(archive_path.parent)
+            if process.returncode != 0:
+                raise subprocess.CalledProcessError(process.returncode, cmd)
             print(f"Extracted TAR.ZST archive using zstd command: {archive_path}")
         else:
+            target_path = archive_path.with_suffix("")
+            cmd = ["zstd", "-d", str(archive_path), "-o", str(target_path)]
+            subprocess.run(cmd, check=True)
             print(f"Decompressed ZST file using zstd command: {archive_path}")
         return True
     except subprocess.CalledProcessError as e:
@@ -440,12 +647,36 @@ def get_unique_folder_name(base_dir: Path) -> Path:
     Returns:
         Path: A unique directory path that does not already exist.
     """
-    if not base_dir.exists():
+    # List the parent once instead of probing each candidate name
+    try:
+        with os.scandir(base_dir.parent) as entries:
+            siblings = {entry.name for entry in entries}
+    except FileNotFoundError:
+        return base_dir
+    if base_dir.name not in siblings:
         return base_dir
 
-    counter = 1
-    while True:
-        new_dir = Path(f"{base_dir} ({counter})")
-        if not new_dir.exists():
-            return new_dir
-        counter += 1
+    pattern = re.compile(rf"{re.escape(base_dir.name)} \((\d+)\)")
+    counters = [
+        int(match.group(1)) for match in map(pattern.fullmatch, siblings) if match
+    ]
+    counter = max(counters, default=0) + 1
+    return base_dir.parent / f"{base_dir.name} ({counter})"
+
+
+# Extraction function for each supported archive extension
+ARCHIVE_HANDLERS: Dict[str, Callable[[Path], bool]] = {
+    ".zip": extract_zip_archive,
+    ".tar": extract_tar_archive,
+    ".tar.gz": extract_tar_archive,
+    ".tgz": extract_tar_archive,
+    ".tar.bz2": extract_tar_archive,
+    ".tbz": extract_tar_archive,
+    ".gz": extract_compressed_file,
+    ".bz2": extract_compressed_file,
+    ".tar.zst": extract_zst_archive,
+    ".tzst": extract_zst_archive,
+    ".zst": extract_zst_archive,
+    ".pst": extract_pst_archive,
+}
+ARCHIVE_EXTS = tuple(ARCHIVE_HANDLERS)
@@ -1,8 +1,19 @@
 #!/usr/bin/env python3
 
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from dataclasses import dataclass
+from itertools import chain
 from pathlib import Path
-from typing import Optional, List, Tuple
+from typing import Dict, Iterable, Optional, List, Tuple, Union
+import errno
 import logging
+import math
 import os
 import re
 import shutil
@@ -12,14 +23,49 @@ import sqlite3
 from common.logger import setup_logging
 from common.indexer import (
     initialize_database,
+    index_exists,
     prompt_use_existing_index,
-    load_directories_from_index,
+    count_directories,
     close_database,
-    update_index_after_change,
+    update_index_after_changes,
 )
 from common.fs_walker import collect_directories
-from common.utils import group_directories, summarize_group
-from common.cli import parse_arguments
+from common.fast_rm import TRASH_DIR_NAME, Trash, fast_rmtree
+from common.utils import (
+    has_nested_duplicate_groups,
+    iter_duplicate_groups,
+    summarize_group,
+)
+from common.cli import parse_arguments, read_answer
+
+MAX_DELETE_WORKERS = 8
+# Number of groups whose plans are applied concurrently with a default choice
+MAX_GROUP_WORKERS = 4
+# Whether files can be moved with link() then unlink(), which fails instead of
+# replacing an existing destination (rename() already does so on Windows)
+MOVE_FILES_BY_LINK = os.name != "nt" and os.link in os.supports_follow_symlinks
+# Errors of link() and rename() on filesystems or mounts they do not support
+LINK_FALLBACK_ERRNOS = {
+    errno.EXDEV,
+    errno.EPERM,
+    errno.EMLINK,
+    errno.ENOTSUP,
+    errno.EOPNOTSUPP,
+}
+# Directory names ending with a " (n)" duplicate suffix
+SUFFIX_PATTERN = re.compile(r".* \((\d+)\)$")
+
+
+@dataclass
+class GroupPlan:
+    """Action chosen for a group of duplicate directories."""
+
+    group_key: Tuple[str, str]
+    base_dir: Path
+    duplicate_dirs: List[Path]
+    action: str
+    # Whether to give the base directory the group's base name
+    rename_base: bool = False
 
 
 def main() -> None:
@@ -45,22 +91,29 @@ def main() -> None:
     conn = initialize_database(args.db_dir)
     manage_index(conn, args)
 
-    directories = load_directories_from_index(conn)
-    total_directories = len(directories)
+    total_directories = count_directories(conn)
     print(f"Total directories indexed: {total_directories:,}")
     logging.info(
         {"action": "directories_indexed", "total_directories": total_directories}
     )
 
-    groups = group_directories(conn)
-    if not groups:
+    groups = iter_duplicate_groups(conn)
+    first_group = next(groups, None)
+    if first_group is None:
         print("No duplicate directories found.")
         logging.info({"action": "no_duplicates_found"})
         close_database(conn)
         return
 
-    for group_key, dir_paths in groups.items():
-        process_group(group_key, dir_paths, args, conn)
+    # Merged duplicates are renamed away and deleted in the background
+    trash = Trash(os.path.join(args.db_dir, TRASH_DIR_NAME))
+    if args.default_choice is None:
+        for group_key, dir_paths in chain([first_group], groups):
+            process_group(group_key, dir_paths, args, conn, trash)
+    else:
+        # No prompt to wait for: overlap the filesystem work of unrelated groups
+        process_groups_concurrently(chain([first_group], groups), args, conn, trash)
+    trash.close()
 
     logging.info({"action": "script_complete"})
     close_database(conn)
@@ -72,9 +125,9 @@ def log_configuration(args) -> None:
     Args:
         args: Parsed command-line arguments.
     """
-    config = vars(args)
-    config["action"] = "configuration"
-    logging.info(config)
+    if logging.getLogger().isEnabledFor(logging.INFO):
+        # Copy the namespace so that the parsed arguments are left untouched
+        logging.info({**vars(args), "action": "configuration"})
 
 
 def manage_index(conn: sqlite3.Connection, args) -> None:
@@ -84,10 +137,8 @@ def manage_index(conn: sqlite3.Connection, args) -> None:
         conn (sqlite3.Connection): SQLite database connection.
         args: Parsed command-line arguments.
     """
-    db_path = os.path.join(args.db_dir, "filesystem_index.db")
-    index_exists = os.path.exists(db_path)
-    if index_exists:
-        use_existing = prompt_use_existing_index()
+    if index_exists(conn):
+        use_existing = prompt_use_existing_index(args)
         if not use_existing:
             print("Rescanning the filesystem and rebuilding the index...")
             collect_directories(conn, args.directory, args.recursive, args.level)
@@ -97,7 +148,11 @@ def manage_index(conn: sqlite3.Connection, args) -> None:
 
 
 def process_group(
-    group_key: Tuple[str, str], dir_paths: List[Path], args, conn: sqlite3.Connection
+    group_key: Tuple[str, str],
+    dir_paths: List[Path],
+    args,
+    conn: sqlite3.Connection,
+    trash: Optional[Trash] = None,
 ) -> None:
     """Processes a group of duplicate directories.
 
@@ -106,6 +161,93 @@ def process_group(
         dir_paths (List[Path]): List of directory paths in the group.
         args: Parsed command-line arguments.
         conn (sqlite3.Connection): SQLite database connection.
+        trash (Optional[Trash]): Trash to discard merged duplicates into, if any.
+    """
+    plan = plan_group(group_key, dir_paths, args, conn)
+    changes = apply_plan(plan, args.dry_run, trash)
+    # Commit the index updates of the whole group in a single transaction
+    with conn:
+        update_index_after_changes(conn, changes)
+
+
+def process_groups_concurrently(
+    groups: Iterable[Tuple[Tuple[str, str], List[Path]]],
+    args,
+    conn: sqlite3.Connection,
+    trash: Optional[Trash] = None,
+) -> None:
+    """Processes groups of duplicate directories, applying their plans on worker threads.
+
+    Groups are planned on the calling thread, which also owns the database
+    connection and writes the index changes returned by the workers. A group
+    waits for the groups in flight whose parent directory contains, or lies
+    within, its own, so that a tree is never changed by two groups at once.
+
+    Args:
+        groups (Iterable[Tuple[Tuple[str, str], List[Path]]]): Group keys and
+            the directory paths in each group.
+        args: Parsed command-line arguments.
+        conn (sqlite3.Connection): SQLite database connection.
+        trash (Optional[Trash]): Trash to discard merged duplicates into, if any.
+    """
+    in_flight: Dict["Future[List[Tuple[str, Path]]]", str] = {}
+
+    def commit(done: Iterable["Future[List[Tuple[str, Path]]]"]) -> None:
+        for future in done:
+            del in_flight[future]
+            with conn:
+                update_index_after_changes(conn, future.result())
+
+    with ThreadPoolExecutor(max_workers=MAX_GROUP_WORKERS) as executor:
+        for group_key, dir_paths in groups:
+            plan = plan_group(group_key, dir_paths, args, conn)
+            parent_dir = group_key[0]
+            overlapping = [
+                future
+                for future, other_dir in in_flight.items()
+                if paths_overlap(parent_dir, other_dir)
+            ]
+            if overlapping:
+                commit(wait(overlapping).done)
+            if len(in_flight) >= MAX_GROUP_WORKERS * 2:
+                commit(wait(in_flight, return_when=FIRST_COMPLETED).done)
+            in_flight[executor.submit(apply_plan, plan, args.dry_run, trash)] = (
+                parent_dir
+            )
+            commit([future for future in in_flight if future.done()])
+        commit(wait(in_flight).done)
+
+
+def paths_overlap(path: str, other_path: str) -> bool:
+    """Checks whether two directory paths are the same or one contains the other.
+
+    Args:
+        path (str): Directory path.
+        other_path (str): Other directory path.
+
+    Returns:
+        bool: True if one of the directories lies within the other.
+    """
+    return (
+        path == other_path
+        or path.startswith(os.path.join(other_path, ""))
+        or other_path.startswith(os.path.join(path, ""))
+    )
+
+
+def plan_group(
+    group_key: Tuple[str, str], dir_paths: List[Path], args, conn: sqlite3.Connection
+) -> GroupPlan:
+    """Summarizes a group of duplicate directories and picks the action to apply.
+
+    Args:
+        group_key (Tuple[str, str]): The group key (parent directory and base name).
+        dir_paths (List[Path]): List of directory paths in the group.
+        args: Parsed command-line arguments.
+        conn (sqlite3.Connection): SQLite database connection.
+
+    Returns:
+        GroupPlan: The action to apply to the group.
     """
     parent_dir, base_name = group_key
     base_dir, duplicate_dirs = identify_base_and_duplicates(dir_paths)
@@ -121,7 +263,37 @@ def process_group(
         }
     )
     action = prompt_user_action(args.default_choice)
-    if action == "1":
+    # The groups below the base directory are read before it is processed, and
+    # renaming the base would move their directories away from under them
+    rename_base = (
+        bool(base_name)
+        and base_dir.name != base_name
+        and not has_nested_duplicate_groups(conn, base_dir)
+    )
+    return GroupPlan(group_key, base_dir, duplicate_dirs, action, rename_base)
+
+
+def apply_plan(
+    plan: GroupPlan, dry_run: bool, trash: Optional[Trash] = None
+) -> List[Tuple[str, Union[Path, Tuple[Path, Path]]]]:
+    """Applies the chosen action to a group of duplicate directories.
+
+    The database is not touched, so that plans can be applied from any thread.
+
+    Args:
+        plan (GroupPlan): The action to apply to the group.
+        dry_run (bool): Whether to perform a dry run.
+        trash (Optional[Trash]): Trash to discard merged duplicates into, if any.
+
+    Returns:
+        List[Tuple[str, Union[Path, Tuple[Path, Path]]]]: The index changes to
+            record, as expected by update_index_after_changes.
+    """
+    parent_dir, base_name = plan.group_key
+    changes: List[Tuple[str, Union[Path, Tuple[Path, Path]]]] = []
+    if plan.action in {"1", "2"}:
+        changes.extend(rename_base_dir(plan, dry_run))
+    if plan.action == "1":
         logging.info(
             {
                 "action": "process_group",
@@ -129,8 +301,8 @@ def process_group(
                 "group": f"{parent_dir}/{base_name}",
             }
         )
-        delete_duplicates(duplicate_dirs, args.dry_run, conn)
-    elif action == "2":
+        changes.extend(delete_duplicates(plan.duplicate_dirs, dry_run))
+    elif plan.action == "2":
         logging.info(
             {
                 "action": "process_group",
@@ -138,8 +310,10 @@ def process_group(
                 "group": f"{parent_dir}/{base_name}",
             }
         )
-        merge_contents(base_dir, duplicate_dirs, args.dry_run, conn)
-    elif action == "3":
+        changes.extend(
+            merge_contents(plan.base_dir, plan.duplicate_dirs, dry_run, trash)
+        )
+    elif plan.action == "3":
         print("Skipping this group.")
         logging.info(
             {
@@ -148,6 +322,67 @@ def process_group(
                 "group": f"{parent_dir}/{base_name}",
             }
         )
+    return changes
+
+
+def rename_base_dir(
+    plan: GroupPlan, dry_run: bool
+) -> List[Tuple[str, Tuple[Path, Path]]]:
+    """Gives a base directory picked for its lowest suffix the group's base name.
+
+    For instance 'folder (2)' becomes 'folder' when no 'folder' exists, so
+    that later runs find an unsuffixed base. Nothing is renamed unless the
+    plan asks for it. The plan is updated in place.
+
+    Args:
+        plan (GroupPlan): The action to apply to the group.
+        dry_run (bool): Whether to perform a dry run.
+
+    Returns:
+        List[Tuple[str, Tuple[Path, Path]]]: The index changes to record.
+    """
+    if not plan.rename_base:
+        return []
+    base_dir = plan.base_dir
+    canonical_dir = base_dir.with_name(plan.group_key[1])
+    if os.path.lexists(canonical_dir):
+        return []
+    if dry_run:
+        print(f"Dry run: would rename {base_dir} to {canonical_dir}")
+        logging.info(
+            {
+                "action": "rename_base",
+                "status": "dry_run",
+                "source": str(base_dir),
+                "destination": str(canonical_dir),
+            }
+        )
+        return []
+    try:
+        print(f"Renaming {base_dir} to {canonical_dir}")
+        os.rename(base_dir, canonical_dir)
+    except OSError as e:
+        print(f"Error renaming {base_dir} to {canonical_dir}: {e}")
+        logging.error(
+            {
+                "action": "rename_base",
+                "status": "error",
+                "source": str(base_dir),
+                "destination": str(canonical_dir),
+                "error": str(e),
+            }
+        )
+        return []
+    logging.info(
+        {
+            "action": "rename_base",
+            "status": "success",
+            "source": str(base_dir),
+            "destination": str(canonical_dir),
+        }
+    )
+    plan.base_dir = canonical_dir
+    return [("rename_directory", (base_dir, canonical_dir))]
 
 
 def identify_base_and_duplicates(dir_paths: List[Path]) -> Tuple[Path, List[Path]]:
@@ -159,20 +394,19 @@ def identify_base_and_duplicates(dir_paths: List[Path]) -> Tuple[Path, List[Path
     Returns:
         Tuple[Path, List[Path]]: Base directory and list of duplicate directories.
     """
-    suffix_pattern = re.compile(r".* \(\d+\)$")
     base_dir: Optional[Path] = None
+    lowest_num = math.inf
     for dir_path in dir_paths:
-        if not suffix_pattern.match(dir_path.name):
+        match = SUFFIX_PATTERN.match(dir_path.name)
+        if match is None:
             base_dir = dir_path
             break
-    if base_dir is None:
-        # No base directory without suffix, pick the one with the lowest suffix number
-        def get_suffix_num(dir_name: str) -> int:
-            match = re.match(r".* \((\d+)\)$", dir_name)
-            return int(match.group(1)) if match else float("inf")
-
-        base_dir = min(dir_paths, key=lambda d: get_suffix_num(d.name))
-    duplicate_dirs = [d for d in dir_paths if d != base_dir]
+        # No base directory without suffix so far, keep the lowest suffix number
+        suffix_num = int(match.group(1))
+        if suffix_num < lowest_num:
+            base_dir, lowest_num = dir_path, suffix_num
+    # base_dir is one of the listed objects, identity is enough to exclude it
+    duplicate_dirs = [d for d in dir_paths if d is not base_dir]
     return base_dir, duplicate_dirs
 
 
@@ -193,7 +427,7 @@ def prompt_user_action(default_choice: Optional[int]) -> str:
     print("2) Merge contents into base folder, then delete duplicates")
     print("3) Skip (do nothing)")
     while True:
-        choice = input("Enter your choice (1/2/3): ").strip()
+        choice = read_answer("Enter your choice (1/2/3): ")
         if choice in {"1", "2", "3"}:
             return choice
         else:
@@ -201,30 +435,46 @@ def prompt_user_action(default_choice: Optional[int]) -> str:
 
 
 def delete_duplicates(
-    duplicate_dirs: List[Path], dry_run: bool, conn: sqlite3.Connection
-) -> None:
+    duplicate_dirs: List[Path], dry_run: bool
+) -> List[Tuple[str, Path]]:
     """Deletes the duplicate directories.
 
     Args:
         duplicate_dirs (List[Path]): List of duplicate directories to delete.
         dry_run (bool): Whether to perform a dry run.
-        conn (sqlite3.Connection): SQLite database connection.
+
+    Returns:
+        List[Tuple[str, Path]]: The index changes to record.
     """
-    for dup_dir in duplicate_dirs:
-        if dry_run:
+    if dry_run:
+        for dup_dir in duplicate_dirs:
             print(f"Dry run: would delete {dup_dir}")
             logging.info(
                 {"action": "delete", "status": "dry_run", "directory": str(dup_dir)}
             )
-        else:
+        return []
+    if not duplicate_dirs:
+        return []
+    deleted: List[Path] = []
+    # Deletions are syscall-bound and release the GIL, so unrelated trees can be
+    # removed concurrently
+    with ThreadPoolExecutor(
+        max_workers=min(MAX_DELETE_WORKERS, len(duplicate_dirs))
+    ) as executor:
+        futures = {}
+        for dup_dir in duplicate_dirs:
+            print(f"Deleting {dup_dir}")
+            # Each duplicate already has its own thread: a pool per tree would
+            # multiply the threads of every group in flight
+            futures[executor.submit(fast_rmtree, dup_dir, max_workers=1)] = dup_dir
+        for future in as_completed(futures):
+            dup_dir = futures[future]
             try:
-                print(f"Deleting {dup_dir}")
-                shutil.rmtree(dup_dir)
+                future.result()
                 logging.info(
                     {"action": "delete", "status": "success", "directory": str(dup_dir)}
                 )
-                # Update index
-                update_index_after_change(conn, "delete_directory", dup_dir)
+                deleted.append(dup_dir)
             except Exception as e:
                 logging.error(
                     {
@@ -234,71 +484,143 @@ def delete_duplicates(
                         "error": str(e),
                     }
                 )
+    return [("delete_directory", dup_dir) for dup_dir in deleted]
 
 
 def merge_contents(
-    base_dir: Path, duplicate_dirs: List[Path], dry_run: bool, conn: sqlite3.Connection
-) -> None:
+    base_dir: Path,
+    duplicate_dirs: List[Path],
+    dry_run: bool,
+    trash: Optional[Trash] = None,
+) -> List[Tuple[str, Union[Path, Tuple[Path, Path]]]]:
     """Merges contents of duplicate directories into the base directory.
 
     Args:
         base_dir (Path): Base directory.
         duplicate_dirs (List[Path]): List of duplicate directories to merge.
         dry_run (bool): Whether to perform a dry run.
-        conn (sqlite3.Connection): SQLite database connection.
+        trash (Optional[Trash]): Trash to discard the merged duplicates into,
+            instead of deleting them in place.
+
+    Returns:
+        List[Tuple[str, Union[Path, Tuple[Path, Path]]]]: The index changes to
+            record.
     """
+    # List the base directory once; names are added as items are moved in.
+    # Names are compared exactly: on case-insensitive filesystems move_path
+    # refuses to replace a case variant, which is reported as a conflict.
+    try:
+        with os.scandir(base_dir) as entries:
+            existing = {entry.name for entry in entries}
+    except FileNotFoundError as e:
+        # Moved or deleted while processing an earlier group
+        print(f"Skipping merge: {base_dir} no longer exists.")
+        logging.error(
+            {
+                "action": "merge",
+                "status": "missing",
+                "directory": str(base_dir),
+                "error": str(e),
+            }
+        )
+        return []
+    # Paths are handled as plain strings in the per-item loop, and destinations
+    # are built by concatenation onto the base directory's prefix
+    base_prefix = os.path.join(os.fspath(base_dir), "")
+    changes: List[Tuple[str, Union[Path, Tuple[Path, Path]]]] = []
     for dup_dir in duplicate_dirs:
-        for item in os.listdir(dup_dir):
-            src = dup_dir / item
-            dst = base_dir / item
-            if dst.exists():
-                print(f"Conflict: {dst} already exists.")
-                print(f"Skipping {src}")
-                logging.info(
-                    {
-                        "action": "merge",
-                        "status": "conflict",
-                        "source": str(src),
-                        "destination": str(dst),
-                    }
-                )
-            else:
-                if dry_run:
-                    print(f"Dry run: would move {src} to {dst}")
+        moved: List[Tuple[str, str, bool]] = []
+        try:
+            entries = os.scandir(dup_dir)
+        except FileNotFoundError as e:
+            print(f"Skipping {dup_dir}: it no longer exists.")
+            logging.error(
+                {
+                    "action": "merge",
+                    "status": "missing",
+                    "directory": str(dup_dir),
+                    "error": str(e),
+                }
+            )
+            continue
+        with entries:
+            for entry in entries:
+                name = entry.name
+                src = entry.path
+                dst = base_prefix + name
+                if name in existing:
+                    print(f"Conflict: {dst} already exists.")
+                    print(f"Skipping {src}")
                     logging.info(
                         {
-                            "action": "move",
-                            "status": "dry_run",
-                            "source": str(src),
-                            "destination": str(dst),
+                            "action": "merge",
+                            "status": "conflict",
+                            "source": src,
+                            "destination": dst,
                         }
                     )
                 else:
-                    try:
-                        print(f"Moving {src} to {dst}")
-                        shutil.move(str(src), str(dst))
+                    if dry_run:
+                        existing.add(name)
+                        print(f"Dry run: would move {src} to {dst}")
                         logging.info(
                             {
                                 "action": "move",
-                                "status": "success",
-                                "source": str(src),
-                                "destination": str(dst),
-                            }
-                        )
-                        # Update index
-                        update_index_after_change(conn, "delete_file", src)
-                        update_index_after_change(conn, "add_file", dst)
-                    except Exception as e:
-                        print(f"Error moving {src} to {dst}: {e}")
-                        logging.error(
-                            {
-                                "action": "move",
-                                "status": "error",
-                                "source": str(src),
-                                "destination": str(dst),
-                                "error": str(e),
+                                "status": "dry_run",
+                                "source": src,
+                                "destination": dst,
                             }
                         )
+                    else:
+                        try:
+                            print(f"Moving {src} to {dst}")
+                            # Read the type before the entry is moved away
+                            is_dir = entry.is_dir(follow_symlinks=False)
+                            move_path(src, dst, is_dir)
+                            existing.add(name)
+                            logging.info(
+                                {
+                                    "action": "move",
+                                    "status": "success",
+                                    "source": src,
+                                    "destination": dst,
+                                }
+                            )
+                            moved.append((src, dst, is_dir))
+                        except FileExistsError:
+                            print(f"Conflict: {dst} already exists.")
+                            print(f"Skipping {src}")
+                            logging.info(
+                                {
+                                    "action": "merge",
+                                    "status": "conflict",
+                                    "source": src,
+                                    "destination": dst,
+                                }
+                            )
+                        except Exception as e:
+                            print(f"Error moving {src} to {dst}: {e}")
+                            logging.error(
+                                {
+                                    "action": "move",
+                                    "status": "error",
+                                    "source": src,
+                                    "destination": dst,
+                                    "error": str(e),
+                                }
+                            )
+        # A moved directory keeps its indexed subtree, only its path changes
+        changes.extend(
+            ("rename_directory", (Path(src), Path(dst)))
+            for src, dst, is_dir in moved
+            if is_dir
+        )
+        changes.extend(
+            ("delete_file", Path(src)) for src, _, is_dir in moved if not is_dir
+        )
+        changes.extend(
+            ("add_file", Path(dst)) for _, dst, is_dir in moved if not is_dir
+        )
         # Delete the duplicate directory
         if dry_run:
             print(f"Dry run: would delete {dup_dir}")
@@ -308,12 +630,15 @@ def merge_contents(
         else:
             try:
                 print(f"Deleting {dup_dir}")
-                shutil.rmtree(dup_dir)
+                if trash is None:
+                    fast_rmtree(dup_dir)
+                else:
+                    # Only conflicting items are left, delete them later
+                    trash.discard(dup_dir)
                 logging.info(
                     {"action": "delete", "status": "success", "directory": str(dup_dir)}
                 )
-                # Update index
-                update_index_after_change(conn, "delete_directory", dup_dir)
+                changes.append(("delete_directory", dup_dir))
             except Exception as e:
                 print(f"Error deleting {dup_dir}: {e}")
                 logging.error(
@@ -324,6 +649,51 @@ def merge_contents(
                         "error": str(e),
                     }
                 )
+    return changes
+
+
+def move_path(src: Union[str, Path], dst: Union[str, Path], is_dir: bool) -> None:
+    """Moves a file or directory without ever replacing the destination.
+
+    Files are hard-linked to the destination, then unlinked: unlike rename()
+    on POSIX, link() fails when the destination exists. Directories are
+    renamed once the destination is checked to be absent, since rename() on
+    POSIX replaces an empty directory. On Windows rename() already fails when
+    the destination exists.
+
+    Args:
+        src (Union[str, Path]): Path to move.
+        dst (Union[str, Path]): Destination path.
+        is_dir (bool): Whether the path is a directory (not a symlink to one).
+
+    Raises:
+        FileExistsError: If the destination exists.
+    """
+    src, dst = os.fspath(src), os.fspath(dst)
+    if is_dir and os.path.lexists(dst):
+        raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dst)
+    try:
+        if is_dir or not MOVE_FILES_BY_LINK:
+            os.rename(src, dst)
+        else:
+            os.link(src, dst, follow_symlinks=False)
+            try:
+                os.unlink(src)
+            except OSError:
+                # Leave the file where it was rather than in both places
+                os.unlink(dst)
+                raise
+    except OSError as e:
+        if e.errno not in LINK_FALLBACK_ERRNOS:
+            raise
+        # Cross-device move, or no hard links on this filesystem: check the
+        # destination, then move it as a plain rename or a copy and delete
+        if os.path.lexists(dst):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dst)
+        if e.errno == errno.EXDEV:
+            shutil.move(src, dst)
+        else:
+            os.rename(src, dst)
 
 
 if __name__ == "__main__":
@@ -1,13 +1,25 @@
 import unittest
+import io
 import tempfile
 import shutil
 import os
 from pathlib import Path
 from unittest.mock import patch
-from dedup_folders.main import identify_base_and_duplicates, process_group
+from dedup_folders.main import (
+    identify_base_and_duplicates,
+    merge_contents,
+    move_path,
+    process_group,
+    process_groups_concurrently,
+    prompt_user_action,
+)
 from common.indexer import initialize_database, close_database
 from common.fs_walker import collect_directories
-from common.utils import group_directories
+from common.utils import (
+    get_directory_sizes,
+    group_directories,
+    iter_duplicate_groups,
+)
 
 
 class TestDedupFolders(unittest.TestCase):
@@ -54,6 +66,25 @@ class TestDedupFolders(unittest.TestCase):
         self.assertEqual(base_dir.name, "folder")
         self.assertEqual(len(duplicate_dirs), 2)
 
+    def test_identify_base_and_duplicates_lowest_suffix(self):
+        dir_paths = [
+            Path(self.test_dir) / "folder (10)",
+            Path(self.test_dir) / "folder (2)",
+            Path(self.test_dir) / "folder (3)",
+        ]
+        base_dir, duplicate_dirs = identify_base_and_duplicates(dir_paths)
+        self.assertEqual(base_dir.name, "folder (2)")
+        self.assertEqual(len(duplicate_dirs), 2)
+
+    @patch("builtins.print")
+    @patch("common.cli._piped_answers", None)
+    @patch("sys.stdout", new_callable=io.StringIO)
+    @patch("sys.stdin", io.StringIO("4\n 2 \n"))
+    def test_prompt_user_action_piped(self, mock_stdout, mock_print):
+        self.assertEqual(prompt_user_action(None), "2")
+        with self.assertRaises(EOFError):
+            prompt_user_action(None)
+
     @patch("builtins.print")
     def test_process_group_delete(self, mock_print):
         # Simulate user choice to delete duplicates
@@ -84,6 +115,257 @@ class TestDedupFolders(unittest.TestCase):
         self.assertTrue((Path(self.test_dir) / "folder" / "file3.txt").exists())
         self.assertTrue((Path(self.test_dir) / "folder" / "file4.txt").exists())
 
+    @patch("builtins.print")
+    def test_process_group_merge_updates_index(self, mock_print):
+        # Simulate user choice to merge duplicates
+        args = type("Args", (), {"dry_run": False, "default_choice": 2})
+        groups = group_directories(self.conn)
+        for group_key, dir_paths in groups.items():
+            process_group(group_key, dir_paths, args, self.conn)
+        # Check that the index follows the moved files and deleted directories
+        cursor = self.conn.execute(
+            "SELECT name FROM files WHERE directory_path = ?",
+            (str(Path(self.test_dir) / "folder"),),
+        )
+        self.assertEqual(
+            sorted(row[0] for row in cursor.fetchall()),
+            ["file1.txt", "file2.txt", "file3.txt", "file4.txt"],
+        )
+        self.assertEqual(group_directories(self.conn), {})
+
+    @patch("builtins.print")
+    def test_process_group_merge_subdirectory(self, mock_print):
+        # Add a subdirectory to a duplicate and rebuild the index
+        (Path(self.test_dir) / "folder (1)" / "subfolder").mkdir()
+        collect_directories(self.conn, self.test_dir, recursive=True)
+        args = type("Args", (), {"dry_run": False, "default_choice": 2})
+        groups = group_directories(self.conn)
+        for group_key, dir_paths in groups.items():
+            process_group(group_key, dir_paths, args, self.conn)
+        # Check that the moved subdirectory is indexed as a directory
+        subfolder = str(Path(self.test_dir) / "folder" / "subfolder")
+        cursor = self.conn.execute(
+            "SELECT COUNT(*) FROM directories WHERE path = ?", (subfolder,)
+        )
+        self.assertEqual(cursor.fetchone()[0], 1)
+        cursor = self.conn.execute(
+            "SELECT COUNT(*) FROM files WHERE name = 'subfolder'"
+        )
+        self.assertEqual(cursor.fetchone()[0], 0)
+
+    @patch("builtins.print")
+    def test_process_group_merge_subdirectory_files(self, mock_print):
+        # Add files below a subdirectory of a duplicate and rebuild the index
+        sub_dir = Path(self.test_dir) / "folder (1)" / "sub"
+        (sub_dir / "deep").mkdir(parents=True)
+        (sub_dir / "a.txt").write_text("a")
+        (sub_dir / "deep" / "b.txt").write_text("bb")
+        collect_directories(self.conn, self.test_dir, recursive=True)
+        args = type("Args", (), {"dry_run": False, "default_choice": 2})
+        for group_key, dir_paths in group_directories(self.conn).items():
+            process_group(group_key, dir_paths, args, self.conn)
+        # Check that the files below the moved subdirectory follow it
+        base_dir = Path(self.test_dir) / "folder"
+        cursor = self.conn.execute(
+            "SELECT directory_path, name FROM files"
+            " WHERE name IN ('a.txt', 'b.txt') ORDER BY name"
+        )
+        self.assertEqual(
+            cursor.fetchall(),
+            [
+                (str(base_dir / "sub"), "a.txt"),
+                (str(base_dir / "sub" / "deep"), "b.txt"),
+            ],
+        )
+        cursor = self.conn.execute(
+            "SELECT parent_path FROM directories WHERE path = ?",
+            (str(base_dir / "sub" / "deep"),),
+        )
+        self.assertEqual(cursor.fetchone()[0], str(base_dir / "sub"))
+        self.assertEqual(
+            get_directory_sizes(self.conn, [base_dir / "sub"]),
+            {str(base_dir / "sub"): (3, 2)},
+        )
+
+    @patch("builtins.print")
+    def test_process_group_merge_dangling_symlink(self, mock_print):
+        (Path(self.test_dir) / "folder (1)" / "link").symlink_to("missing.txt")
+        args = type("Args", (), {"dry_run": False, "default_choice": 2})
+        for group_key, dir_paths in group_directories(self.conn).items():
+            process_group(group_key, dir_paths, args, self.conn)
+        base_dir = Path(self.test_dir) / "folder"
+        self.assertTrue((base_dir / "link").is_symlink())
+        # The moved files are indexed, and the symlink is not, as when scanning
+        cursor = self.conn.execute(
+            "SELECT name FROM files WHERE directory_path = ?", (str(base_dir),)
+        )
+        self.assertEqual(
+            sorted(row[0] for row in cursor.fetchall()),
+            ["file1.txt", "file2.txt", "file3.txt", "file4.txt"],
+        )
+
+    @patch("builtins.print")
+    def test_process_streamed_groups(self, mock_print):
+        # Add nested duplicates inside a duplicate and rebuild the index
+        (Path(self.test_dir) / "folder (1)" / "nested").mkdir()
+        (Path(self.test_dir) / "folder (1)" / "nested (1)").mkdir()
+        collect_directories(self.conn, self.test_dir, recursive=True)
+        # Update the index while the groups are still being read
+        args = type("Args", (), {"dry_run": False, "default_choice": 1})
+        for group_key, dir_paths in iter_duplicate_groups(self.conn):
+            process_group(group_key, dir_paths, args, self.conn)
+        self.assertTrue((Path(self.test_dir) / "folder").exists())
+        self.assertFalse((Path(self.test_dir) / "folder (1)").exists())
+        self.assertEqual(group_directories(self.conn), {})
+
+    @patch("builtins.print")
+    def test_process_groups_concurrently(self, mock_print):
+        # Add more groups, one of them nested in the first group's base
+        for name in ["other", "other (1)", "folder/nested", "folder/nested (1)"]:
+            (Path(self.test_dir) / name).mkdir()
+        (Path(self.test_dir) / "other (1)" / "file5.txt").touch()
+        collect_directories(self.conn, self.test_dir, recursive=True)
+        args = type("Args", (), {"dry_run": False, "default_choice": 2})
+        process_groups_concurrently(iter_duplicate_groups(self.conn), args, self.conn)
+        for name in ["folder (1)", "folder (2)", "other (1)", "folder/nested (1)"]:
+            self.assertFalse((Path(self.test_dir) / name).exists())
+        self.assertTrue((Path(self.test_dir) / "other" / "file5.txt").exists())
+        self.assertEqual(group_directories(self.conn), {})
+        cursor = self.conn.execute(
+            "SELECT COUNT(*) FROM files WHERE directory_path = ?",
+            (str(Path(self.test_dir) / "other"),),
+        )
+        self.assertEqual(cursor.fetchone()[0], 1)
+
+    @patch("builtins.print")
+    def test_process_group_renames_suffixed_base(self, mock_print):
+        # Leave only suffixed duplicates and rebuild the index
+        shutil.rmtree(Path(self.test_dir) / "folder")
+        (Path(self.test_dir) / "folder (1)" / "nested").mkdir()
+        (Path(self.test_dir) / "folder (1)" / "nested" / "file5.txt").touch()
+        collect_directories(self.conn, self.test_dir, recursive=True)
+        args = type("Args", (), {"dry_run": False, "default_choice": 2})
+        for group_key, dir_paths in group_directories(self.conn).items():
+            process_group(group_key, dir_paths, args, self.conn)
+        base_dir = Path(self.test_dir) / "folder"
+        self.assertEqual(
+            sorted(os.listdir(base_dir)), ["file3.txt", "file4.txt", "nested"]
+        )
+        self.assertFalse((Path(self.test_dir) / "folder (1)").exists())
+        # Check that the renamed subtree is indexed under its new path
+        cursor = self.conn.execute(
+            "SELECT directory_path, name FROM files"
+            " WHERE name LIKE 'file%.txt' ORDER BY name"
+        )
+        self.assertEqual(
+            cursor.fetchall(),
+            [
+                (str(base_dir), "file3.txt"),
+                (str(base_dir), "file4.txt"),
+                (str(base_dir / "nested"), "file5.txt"),
+            ],
+        )
+        cursor = self.conn.execute(
+            "SELECT parent_path FROM directories WHERE path = ?",
+            (str(base_dir / "nested"),),
+        )
+        self.assertEqual(cursor.fetchone()[0], str(base_dir))
+
+    @patch("builtins.print")
+    def test_process_groups_keeps_base_with_nested_groups(self, mock_print):
+        # Leave only suffixed duplicates, with a nested group in the base
+        shutil.rmtree(Path(self.test_dir) / "folder")
+        (Path(self.test_dir) / "folder (1)" / "nested").mkdir()
+        (Path(self.test_dir) / "folder (1)" / "nested (1)").mkdir()
+        (Path(self.test_dir) / "folder (1)" / "nested (1)" / "file5.txt").touch()
+        collect_directories(self.conn, self.test_dir, recursive=True)
+        args = type("Args", (), {"dry_run": False, "default_choice": 2})
+        for group_key, dir_paths in iter_duplicate_groups(self.conn):
+            process_group(group_key, dir_paths, args, self.conn)
+        # The base keeps its name since the nested group was still pending
+        base_dir = Path(self.test_dir) / "folder (1)"
+        self.assertFalse((Path(self.test_dir) / "folder (2)").exists())
+        self.assertFalse((base_dir / "nested (1)").exists())
+        self.assertTrue((base_dir / "nested" / "file5.txt").exists())
+        self.assertEqual(group_directories(self.conn), {})
+
+    @patch("builtins.print")
+    def test_process_group_empty_base_name(self, mock_print):
+        # Directories named after nothing but a suffix
+        (Path(self.test_dir) / " (1)").mkdir()
+        (Path(self.test_dir) / " (2)").mkdir()
+        (Path(self.test_dir) / " (2)" / "file5.txt").touch()
+        collect_directories(self.conn, self.test_dir, recursive=True)
+        args = type("Args", (), {"dry_run": False, "default_choice": 2})
+        for group_key, dir_paths in group_directories(self.conn).items():
+            process_group(group_key, dir_paths, args, self.conn)
+        self.assertTrue((Path(self.test_dir) / " (1)" / "file5.txt").exists())
+        self.assertFalse((Path(self.test_dir) / " (2)").exists())
+
+    @patch("builtins.print")
+    def test_merge_contents_keeps_case_variants(self, mock_print):
+        base_dir = Path(self.test_dir) / "folder"
+        (base_dir / "readme").write_text("base")
+        (Path(self.test_dir) / "folder (1)" / "README").write_text("duplicate")
+        if (base_dir / "README").exists():
+            self.skipTest("case-insensitive filesystem")
+        merge_contents(base_dir, [Path(self.test_dir) / "folder (1)"], False)
+        # Both names are distinct files on a case-sensitive filesystem
+        self.assertEqual((base_dir / "readme").read_text(), "base")
+        self.assertEqual((base_dir / "README").read_text(), "duplicate")
+
+    @patch("builtins.print")
+    def test_merge_contents_refused_move_is_conflict(self, mock_print):
+        # As when a case variant exists on a case-insensitive filesystem
+        base_dir = Path(self.test_dir) / "folder"
+        with patch("dedup_folders.main.move_path", side_effect=FileExistsError):
+            changes = merge_contents(
+                base_dir, [Path(self.test_dir) / "folder (1)"], False
+            )
+        self.assertEqual(
+            changes, [("delete_directory", Path(self.test_dir) / "folder (1)")]
+        )
+        self.assertFalse((base_dir / "file3.txt").exists())
+
+    def test_move_path_refuses_to_overwrite(self):
+        src = Path(self.test_dir) / "folder (1)" / "file3.txt"
+        dst = Path(self.test_dir) / "folder" / "file1.txt"
+        src.write_text("source")
+        with self.assertRaises(FileExistsError):
+            move_path(src, dst, False)
+        self.assertEqual(src.read_text(), "source")
+        self.assertEqual(dst.read_text(), "")
+        src_dir = Path(self.test_dir) / "folder (1)"
+        with self.assertRaises(FileExistsError):
+            move_path(src_dir, Path(self.test_dir) / "folder", True)
+        self.assertTrue(src.exists())
+        # An empty destination directory is not replaced either
+        empty_dir = Path(self.test_dir) / "empty"
+        empty_dir.mkdir()
+        with self.assertRaises(FileExistsError):
+            move_path(src_dir, empty_dir, True)
+        self.assertTrue(src.exists())
+
+    def test_move_path_moves_symlinks(self):
+        link = Path(self.test_dir) / "folder (1)" / "link"
+        link.symlink_to("file3.txt")
+        dst = Path(self.test_dir) / "folder" / "link"
+        move_path(link, dst, False)
+        self.assertTrue(dst.is_symlink())
+        self.assertEqual(os.readlink(dst), "file3.txt")
+        self.assertFalse(os.path.lexists(link))
+
+    @patch("builtins.print")
+    def test_merge_contents_skips_missing_directories(self, mock_print):
+        base_dir = Path(self.test_dir) / "folder"
+        missing_dir = Path(self.test_dir) / "missing"
+        self.assertEqual(merge_contents(missing_dir, [base_dir], False), [])
+        self.assertTrue((base_dir / "file1.txt").exists())
+        changes = merge_contents(
+            base_dir, [missing_dir, Path(self.test_dir) / "folder (1)"], False
+        )
+        self.assertIn(("add_file", base_dir / "file3.txt"), changes)
+
 
 if __name__ == "__main__":
     unittest.main()
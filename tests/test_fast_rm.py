@@ -0,0 +1,73 @@
+import unittest
+import tempfile
+import shutil
+import errno
+import os
+from pathlib import Path
+from unittest.mock import patch
+from common.fast_rm import TRASH_DIR_NAME, Trash, fast_rmtree
+
+
+class TestFastRm(unittest.TestCase):
+    def setUp(self):
+        # Create a temporary directory for testing
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        # Remove temporary directory
+        shutil.rmtree(self.test_dir)
+
+    def test_fast_rmtree(self):
+        root = Path(self.test_dir) / "tree"
+        for i in range(3):
+            nested_dir = root / f"dir{i}" / "nested"
+            nested_dir.mkdir(parents=True)
+            (nested_dir / "file.txt").touch()
+        (root / "file.txt").touch()
+        fast_rmtree(root)
+        self.assertFalse(root.exists())
+
+    def test_fast_rmtree_keeps_symlink_targets(self):
+        target = Path(self.test_dir) / "target"
+        target.mkdir()
+        (target / "file.txt").touch()
+        root = Path(self.test_dir) / "tree"
+        root.mkdir()
+        os.symlink(target, root / "link")
+        fast_rmtree(root)
+        self.assertFalse(root.exists())
+        self.assertTrue((target / "file.txt").exists())
+
+    def test_fast_rmtree_refuses_symlink(self):
+        target = Path(self.test_dir) / "target"
+        target.mkdir()
+        link = Path(self.test_dir) / "link"
+        os.symlink(target, link)
+        with self.assertRaises(OSError):
+            fast_rmtree(link)
+        self.assertTrue(target.exists())
+
+    def test_trash_discard(self):
+        root = Path(self.test_dir) / "tree"
+        (root / "nested").mkdir(parents=True)
+        (root / "nested" / "file.txt").touch()
+        trash = Trash(Path(self.test_dir) / TRASH_DIR_NAME)
+        trash.discard(root)
+        self.assertFalse(root.exists())
+        trash.close()
+        self.assertFalse((Path(self.test_dir) / TRASH_DIR_NAME).exists())
+
+    def test_trash_discard_across_devices(self):
+        root = Path(self.test_dir) / "tree"
+        (root / "nested").mkdir(parents=True)
+        trash = Trash(Path(self.test_dir) / TRASH_DIR_NAME)
+        cross_device = OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+        with patch("common.fast_rm.os.rename", side_effect=cross_device):
+            trash.discard(root)
+        self.assertFalse(root.exists())
+        trash.close()
+        self.assertFalse((Path(self.test_dir) / TRASH_DIR_NAME).exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
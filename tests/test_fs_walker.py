@@ -0,0 +1,37 @@
+import unittest
+import tempfile
+import shutil
+from pathlib import Path
+from common.fs_walker import iter_entries, walk_tree, PARALLEL_THRESHOLD
+
+
+class TestFsWalker(unittest.TestCase):
+    def setUp(self):
+        # Create a temporary directory for testing
+        self.test_dir = tempfile.mkdtemp()
+        # Create enough subdirectories to trigger the parallel walk
+        for i in range(PARALLEL_THRESHOLD + 2):
+            nested_dir = Path(self.test_dir) / f"dir{i}" / "nested"
+            nested_dir.mkdir(parents=True)
+            (nested_dir.parent / "file.txt").touch()
+            (nested_dir / "nested_file.txt").touch()
+
+    def tearDown(self):
+        # Remove temporary directory
+        shutil.rmtree(self.test_dir)
+
+    def test_parallel_walk_matches_serial_walk(self):
+        root = Path(self.test_dir)
+        parallel_rows = sorted(iter_entries(root, 1, True, None))
+        serial_rows = sorted(walk_tree(root, 1, True, None))
+        self.assertEqual(parallel_rows, serial_rows)
+        self.assertEqual(len(serial_rows), (PARALLEL_THRESHOLD + 2) * 4)
+
+    def test_walk_respects_level(self):
+        rows = list(iter_entries(Path(self.test_dir), 1, True, 2))
+        # Only the top-level directories and their direct children are listed
+        self.assertEqual(len(rows), (PARALLEL_THRESHOLD + 2) * 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import tempfile
+import shutil
+from pathlib import Path
+from common.indexer import (
+    initialize_database,
+    close_database,
+    count_directories,
+    index_exists,
+    update_index_after_change,
+)
+from common.fs_walker import collect_directories
+from common.utils import (
+    DUPLICATE_GROUPS_SQL,
+    get_directory_size,
+    get_directory_sizes,
+)
+
+
+class TestIndexer(unittest.TestCase):
+    def setUp(self):
+        # Create a temporary directory for testing
+        self.test_dir = tempfile.mkdtemp()
+        # Set up test directories
+        self.setup_test_directories()
+        # Initialize database outside of the scanned tree
+        self.db_dir = tempfile.mkdtemp()
+        self.conn = initialize_database(self.db_dir)
+        # Collect directories
+        collect_directories(self.conn, self.test_dir, recursive=True)
+
+    def tearDown(self):
+        # Close database connection
+        close_database(self.conn)
+        # Remove temporary directories
+        shutil.rmtree(self.test_dir)
+        shutil.rmtree(self.db_dir)
+
+    def setup_test_directories(self):
+        # Create a directory tree and a sibling sharing its name as a prefix
+        nested_dir = Path(self.test_dir) / "folder" / "nested"
+        sibling_dir = Path(self.test_dir) / "folderbis"
+        nested_dir.mkdir(parents=True)
+        sibling_dir.mkdir()
+        (nested_dir / "file1.txt").touch()
+        (sibling_dir / "file2.txt").touch()
+
+    def indexed_directories(self):
+        cursor = self.conn.execute("SELECT path FROM directories")
+        return {Path(row[0]).name for row in cursor.fetchall()}
+
+    def indexed_files(self):
+        cursor = self.conn.execute("SELECT name FROM files")
+        return {row[0] for row in cursor.fetchall()}
+
+    def test_delete_directory_removes_subtree(self):
+        update_index_after_change(
+            self.conn, "delete_directory", Path(self.test_dir) / "folder"
+        )
+        self.assertEqual(self.indexed_directories(), {"folderbis"})
+        self.assertEqual(self.indexed_files(), {"file2.txt"})
+
+    def test_duplicate_groups_use_covering_index(self):
+        cursor = self.conn.execute("EXPLAIN QUERY PLAN " + DUPLICATE_GROUPS_SQL)
+        plan = " ".join(row[-1] for row in cursor.fetchall())
+        self.assertIn("COVERING INDEX idx_dirs_parent_base_path", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_directory_sizes_include_subdirectories(self):
+        (Path(self.test_dir) / "folder" / "nested" / "file1.txt").write_text("abc")
+        collect_directories(self.conn, self.test_dir, recursive=True)
+        folder = Path(self.test_dir) / "folder"
+        sizes = get_directory_sizes(self.conn, [folder, folder / "nested"])
+        self.assertEqual(sizes[str(folder)], (3, 1))
+        self.assertEqual(sizes[str(folder / "nested")], (3, 1))
+        self.assertEqual(
+            get_directory_size(self.conn, Path(self.test_dir) / "folderbis"), (0, 1)
+        )
+
+    def test_index_exists(self):
+        self.assertTrue(index_exists(self.conn))
+        conn = initialize_database(self.db_dir, "empty_index.db")
+        try:
+            self.assertFalse(index_exists(conn))
+            # A flat directory has files but no subdirectories
+            collect_directories(conn, Path(self.test_dir) / "folderbis", False)
+            self.assertTrue(index_exists(conn))
+        finally:
+            close_database(conn)
+
+    def test_count_directories(self):
+        self.assertEqual(count_directories(self.conn), 3)
+        update_index_after_change(
+            self.conn, "delete_directory", Path(self.test_dir) / "folder"
+        )
+        self.assertEqual(count_directories(self.conn), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import tempfile
+import shutil
+import json
+import logging
+import os
+import queue
+import sys
+from common.logger import (
+    BatchingQueueListener,
+    BufferedRotatingFileHandler,
+    JsonFormatter,
+    StructuredQueueHandler,
+)
+
+
+class TestLogger(unittest.TestCase):
+    def setUp(self):
+        # Create a temporary directory for testing
+        self.test_dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.test_dir, "test.log")
+
+    def tearDown(self):
+        # Remove temporary directory
+        shutil.rmtree(self.test_dir)
+
+    def test_queued_records_are_written(self):
+        handler = BufferedRotatingFileHandler(self.log_file)
+        handler.setFormatter(JsonFormatter())
+        log_queue = queue.SimpleQueue()
+        listener = BatchingQueueListener(log_queue, handler)
+        logger = logging.getLogger("test_logger")
+        logger.propagate = False
+        queue_handler = StructuredQueueHandler(log_queue)
+        logger.addHandler(queue_handler)
+        listener.start()
+        try:
+            for i in range(100):
+                logger.warning({"action": "test", "index": i})
+        finally:
+            listener.stop()
+            logger.removeHandler(queue_handler)
+            handler.close()
+        with open(self.log_file) as f:
+            messages = [json.loads(line)["message"] for line in f]
+        self.assertEqual(messages, [{"action": "test", "index": i} for i in range(100)])
+
+    def test_prepare_only_copies_records_with_tracebacks(self):
+        queue_handler = StructuredQueueHandler(queue.SimpleQueue())
+        record = logging.LogRecord(
+            "test", logging.INFO, __file__, 1, {"action": "test"}, (), None
+        )
+        self.assertIs(queue_handler.prepare(record), record)
+        try:
+            raise ValueError("test")
+        except ValueError:
+            record.exc_info = sys.exc_info()
+        prepared = queue_handler.prepare(record)
+        self.assertIsNot(prepared, record)
+        self.assertIsNone(prepared.exc_info)
+        self.assertIn("ValueError: test", prepared.exc_text)
+        self.assertIsNotNone(record.exc_info)
+
+
+if __name__ == "__main__":
+    unittest.main()
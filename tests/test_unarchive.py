@@ -4,9 +4,15 @@ import shutil
 import os
 from pathlib import Path
 from unittest.mock import patch
-from unarchive.main import process_archive
+from unarchive.main import extract_archives, process_archive
 from common.indexer import initialize_database, close_database
-from common.utils import get_archive_files
+from common.fs_walker import collect_directories
+from common.utils import (
+    get_archive_files,
+    extract_all,
+    get_top_level_names,
+    get_unique_folder_name,
+)
 
 
 class TestUnarchive(unittest.TestCase):
@@ -245,6 +251,210 @@ class TestUnarchive(unittest.TestCase):
         # Archive should still exist
         self.assertTrue((Path(self.test_dir) / "archive.zip").exists())
 
+    @patch("builtins.print")
+    def test_process_archive_updates_index(self, mock_print):
+        """
+        Test that extracting and deleting an archive updates the index in place.
+        """
+        other_dir = Path(self.test_dir) / "other"
+        other_dir.mkdir()
+        (other_dir / "other_file.txt").touch()
+        collect_directories(self.conn, self.test_dir, recursive=True)
+        args = type(
+            "Args",
+            (),
+            {"dry_run": False, "default_choice": 1, "default_delete_choice": 1},
+        )
+        for archive_file in get_archive_files(self.test_dir, recursive=False):
+            process_archive(archive_file, args, self.conn)
+        cursor = self.conn.execute(
+            "SELECT name FROM files WHERE name NOT LIKE 'filesystem_index.db%'"
+        )
+        self.assertEqual(
+            sorted(row[0] for row in cursor.fetchall()),
+            ["other_file.txt", "test_file.txt"],
+        )
+
+    @patch("builtins.print")
+    def test_process_archive_rescans_only_extracted_entries(self, mock_print):
+        """
+        Test that extraction does not walk the existing subdirectories again.
+        """
+        other_dir = Path(self.test_dir) / "other"
+        other_dir.mkdir()
+        collect_directories(self.conn, self.test_dir, recursive=True)
+        # Added after indexing, so only a rescan of other_dir would find it
+        (other_dir / "other_file.txt").touch()
+        args = type(
+            "Args",
+            (),
+            {"dry_run": False, "default_choice": 1, "default_delete_choice": 2},
+        )
+        for archive_file in get_archive_files(self.test_dir, recursive=False):
+            process_archive(archive_file, args, self.conn)
+        cursor = self.conn.execute(
+            "SELECT name FROM files WHERE name NOT LIKE 'filesystem_index.db%'"
+        )
+        self.assertEqual(
+            sorted(row[0] for row in cursor.fetchall()),
+            ["archive.zip", "test_file.txt"],
+        )
+
+    @patch("builtins.print")
+    def test_extract_into_existing_directory_updates_index(self, mock_print):
+        """
+        Test that files extracted into an existing subdirectory are indexed.
+        """
+        import zipfile
+
+        docs_dir = Path(self.test_dir) / "docs" / "deep"
+        docs_dir.mkdir(parents=True)
+        with zipfile.ZipFile(Path(self.test_dir) / "docs.zip", "w") as zipf:
+            zipf.writestr("docs/new.txt", "")
+            zipf.writestr("docs/deep/deep.txt", "")
+        args = type(
+            "Args",
+            (),
+            {
+                "dry_run": False,
+                "default_choice": 1,
+                "default_delete_choice": 2,
+                "jobs": 2,
+            },
+        )
+        for extract in (process_archive, None):
+            collect_directories(self.conn, self.test_dir, recursive=True)
+            archive_files = get_archive_files(self.test_dir, recursive=False)
+            if extract is None:
+                extract_archives(archive_files, args, self.conn)
+            else:
+                for archive_file in archive_files:
+                    extract(archive_file, args, self.conn)
+            cursor = self.conn.execute(
+                "SELECT directory_path, name FROM files"
+                " WHERE name IN ('new.txt', 'deep.txt') ORDER BY name"
+            )
+            self.assertEqual(
+                cursor.fetchall(),
+                [
+                    (str(docs_dir), "deep.txt"),
+                    (str(docs_dir.parent), "new.txt"),
+                ],
+            )
+            os.remove(docs_dir / "deep.txt")
+            os.remove(docs_dir.parent / "new.txt")
+
+    def test_get_top_level_names(self):
+        """
+        Test listing the entries an archive extracts into its directory.
+        """
+        import tarfile
+
+        self.assertEqual(
+            get_top_level_names(Path(self.test_dir) / "archive.zip"),
+            {"test_file.txt"},
+        )
+        tar_path = Path(self.test_dir) / "archive.tar.gz"
+        with tarfile.open(tar_path, "w:gz") as tar:
+            tar.add(self.test_dir, arcname="./docs", recursive=False)
+        self.assertEqual(get_top_level_names(tar_path), {"docs"})
+        self.assertEqual(get_top_level_names(Path(self.test_dir) / "file.gz"), set())
+        self.assertIsNone(get_top_level_names(Path(self.test_dir) / "missing.zip"))
+
+    @patch("builtins.print")
+    def test_extract_archives(self, mock_print):
+        """
+        Test extracting several archives in parallel, then deleting them.
+        """
+        import zipfile
+
+        nested_dir = Path(self.test_dir) / "nested"
+        nested_dir.mkdir()
+        with zipfile.ZipFile(nested_dir / "other.zip", "w") as zipf:
+            zipf.writestr("other_file.txt", "")
+        args = type(
+            "Args",
+            (),
+            {
+                "dry_run": False,
+                "default_choice": 1,
+                "default_delete_choice": 1,
+                "jobs": 2,
+            },
+        )
+        archive_files = get_archive_files(self.test_dir, recursive=True)
+        self.assertEqual(len(archive_files), 2)
+        extract_archives(archive_files, args, self.conn)
+        self.assertTrue((Path(self.test_dir) / "test_file.txt").exists())
+        self.assertTrue((nested_dir / "other_file.txt").exists())
+        self.assertEqual(get_archive_files(self.test_dir, recursive=True), [])
+
+    @patch("builtins.print")
+    def test_extract_archives_updates_index(self, mock_print):
+        """
+        Test that extracting archives sharing directories updates the index.
+        """
+        import zipfile
+
+        nested_dir = Path(self.test_dir) / "nested"
+        nested_dir.mkdir()
+        with zipfile.ZipFile(Path(self.test_dir) / "second.zip", "w") as zipf:
+            zipf.writestr("second_file.txt", "")
+            zipf.writestr("second/deep/deep_file.txt", "")
+        with zipfile.ZipFile(nested_dir / "other.zip", "w") as zipf:
+            zipf.writestr("other_file.txt", "")
+        collect_directories(self.conn, self.test_dir, recursive=True)
+        args = type(
+            "Args",
+            (),
+            {
+                "dry_run": False,
+                "default_choice": 1,
+                "default_delete_choice": 1,
+                "jobs": 2,
+            },
+        )
+        archive_files = get_archive_files(self.test_dir, recursive=True)
+        extract_archives(archive_files, args, self.conn)
+        cursor = self.conn.execute(
+            "SELECT directory_path, name FROM files"
+            " WHERE name NOT LIKE 'filesystem_index.db%' ORDER BY name"
+        )
+        self.assertEqual(
+            cursor.fetchall(),
+            [
+                (os.path.join(self.test_dir, "second", "deep"), "deep_file.txt"),
+                (str(nested_dir), "other_file.txt"),
+                (self.test_dir, "second_file.txt"),
+                (self.test_dir, "test_file.txt"),
+            ],
+        )
+
+    @patch("builtins.print")
+    def test_extract_all(self, mock_print):
+        """
+        Test extracting archives in parallel worker processes.
+        """
+        invalid_archive = Path(self.test_dir) / "invalid.zip"
+        invalid_archive.write_text("not a zip file")
+        archive_files = sorted(get_archive_files(self.test_dir, recursive=False))
+        results = extract_all(archive_files, max_workers=2)
+        self.assertEqual(results, [True, False])
+        self.assertTrue((Path(self.test_dir) / "test_file.txt").exists())
+
+    def test_get_unique_folder_name(self):
+        """
+        Test picking the next free '(n)' suffix for an extraction folder.
+        """
+        base_dir = Path(self.test_dir) / "mailbox"
+        self.assertEqual(get_unique_folder_name(base_dir), base_dir)
+        base_dir.mkdir()
+        (Path(self.test_dir) / "mailbox (3)").mkdir()
+        (Path(self.test_dir) / "mailbox.old (7)").mkdir()
+        self.assertEqual(
+            get_unique_folder_name(base_dir), Path(self.test_dir) / "mailbox (4)"
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,20 +1,26 @@
 #!/usr/bin/env python3
 
-import os
 import logging
+import os
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional, Set
 
 # Import common modules
 from common.logger import setup_logging
-from common.utils import get_archive_files, extract_archive
+from common.utils import (
+    iter_archive_files,
+    extract_all,
+    extract_archive,
+    get_top_level_names,
+)
 from common.indexer import (
     initialize_database,
+    index_exists,
     prompt_use_existing_index,
     close_database,
-    update_index_after_change,
+    update_index_after_changes,
 )
-from common.fs_walker import collect_directories
+from common.fs_walker import collect_directories, refresh_directory
 from common.cli import parse_arguments
 
 
@@ -34,44 +40,76 @@ def main():
         choices=[1, 2],
         help="Default choice to apply when prompted to delete after extraction (1: delete, 2: keep)",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Number of archives to extract in parallel (default: number of CPUs)",
+    )
     args = parser.parse_args()
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
     setup_logging("unarchive", args.log_dir)
     log_configuration(args)
 
     conn = initialize_database(args.db_dir)
-    manage_index(conn, args)
+    try:
+        if args.default_choice == 2:
+            # Every archive will be skipped, so the index is never read or updated
+            logging.info({"action": "index_skipped"})
+        else:
+            manage_index(conn, args)
+        process_archives(args, conn)
+    finally:
+        # Close the database even if processing fails, so that the WAL is
+        # checkpointed instead of being left for the next run to recover
+        close_database(conn)
 
-    archive_files = get_archive_files(args.directory, args.recursive)
-    total_archives = len(archive_files)
+
+def process_archives(args, conn) -> None:
+    """Finds the archives to process, asks about them, then extracts them.
+
+    Args:
+        args: Parsed command-line arguments.
+        conn: SQLite database connection.
+    """
+    # Ask about every archive first, so that extractions run without waiting
+    # on the user and can be done in parallel. The archives are asked about
+    # as the walk finds them, and only the selected ones are kept.
+    total_archives = 0
+    selected_archives = []
+    for archive_file in iter_archive_files(args.directory, args.recursive):
+        total_archives += 1
+        if select_archive(archive_file, args):
+            selected_archives.append(archive_file)
     print(f"Found {total_archives} archive files.")
     logging.info({"action": "archives_found", "total_archives": total_archives})
 
     if total_archives == 0:
         print("No archive files found.")
         logging.info({"action": "no_archives_found"})
-        close_database(conn)
         return
 
-    for archive_file in archive_files:
-        process_archive(archive_file, args, conn)
+    if args.dry_run:
+        for archive_file in selected_archives:
+            extract_and_update_index(archive_file, args, conn)
+    else:
+        extract_archives(selected_archives, args, conn)
 
     logging.info({"action": "script_complete"})
-    close_database(conn)
 
 
 def log_configuration(args):
     """Logs the configuration used to run the script."""
-    config = vars(args)
-    config["action"] = "configuration"
-    logging.info(config)
+    if logging.getLogger().isEnabledFor(logging.INFO):
+        # Copy the namespace so that the parsed arguments are left untouched
+        logging.info({**vars(args), "action": "configuration"})
 
 
 def manage_index(conn, args):
     """Manages the index, prompting the user to use existing index or rescan."""
-    db_path = os.path.join(args.db_dir, "filesystem_index.db")
-    index_exists = os.path.exists(db_path)
-    if index_exists:
-        use_existing = prompt_use_existing_index()
+    if index_exists(conn):
+        use_existing = prompt_use_existing_index(args)
         if not use_existing:
             print("Rescanning the filesystem and rebuilding the index...")
             collect_directories(conn, args.directory, args.recursive)
@@ -88,13 +126,26 @@ def process_archive(archive_file: Path, args, conn) -> None:
         args: Parsed command-line arguments.
         conn: SQLite database connection.
     """
+    if select_archive(archive_file, args):
+        extract_and_update_index(archive_file, args, conn)
+
+
+def select_archive(archive_file: Path, args) -> bool:
+    """Asks whether to extract an archive file.
+
+    Args:
+        archive_file (Path): The archive file in question.
+        args: Parsed command-line arguments.
+
+    Returns:
+        bool: True if the archive is to be extracted.
+    """
     print(f"\nFound archive: {archive_file}")
     action = prompt_user_action(archive_file, args.default_choice)
-    if action == "1":
-        extract_and_update_index(archive_file, args, conn)
-    elif action == "2":
+    if action == "2":
         print(f"Skipping archive: {archive_file}")
         logging.info({"action": "skip_archive", "archive": str(archive_file)})
+    return action == "1"
 
 
 def prompt_user_action(archive_file: Path, default_choice: Optional[int]) -> str:
@@ -109,7 +160,8 @@ def prompt_user_action(archive_file: Path, default_choice: Optional[int]) -> str
     """
     if default_choice:
         print(f"Applying default choice {default_choice} for {archive_file}")
-        return str(default_choice)
+        # Return the constant strings rather than converting for every archive
+        return "1" if default_choice == 1 else "2"
 
     print("\nSelect an action:")
     print("1) Extract the archive")
@@ -138,7 +190,7 @@ def prompt_delete_action(
         print(
             f"Applying default delete choice {default_delete_choice} for {archive_file}"
         )
-        return str(default_delete_choice)
+        return "1" if default_delete_choice == 1 else "2"
 
     print("\nExtraction complete.")
     print("Do you want to delete the archive file?")
@@ -166,76 +218,193 @@ def extract_and_update_index(archive_file: Path, args, conn) -> None:
             {"action": "extract", "status": "dry_run", "archive": str(archive_file)}
         )
     else:
+        previous_entries = set(os.listdir(archive_file.parent))
+        extracted_names = get_top_level_names(archive_file)
         success = extract_archive(archive_file)
-        if success:
-            logging.info(
-                {"action": "extract", "status": "success", "archive": str(archive_file)}
-            )
-            # Update index with new files/directories
-            update_index_after_extraction(conn, archive_file.parent)
-            # Prompt to delete the archive
-            delete_action = prompt_delete_action(
-                archive_file, args.default_delete_choice
+        record_extraction(
+            archive_file, success, args, conn, previous_entries, extracted_names
+        )
+
+
+def extract_archives(archive_files: List[Path], args, conn) -> None:
+    """Extracts archives in parallel worker processes, then updates the index.
+
+    Only the extraction runs in the workers, as many at a time as requested
+    with --jobs: the results are recorded one archive at a time on the
+    database connection of this process. Each directory that received an
+    extraction is then rescanned once, however many archives it held.
+
+    Args:
+        archive_files (List[Path]): The archive files to extract.
+        args: Parsed command-line arguments.
+        conn: SQLite database connection.
+    """
+    # List each directory and archive before extracting, to find out what
+    # was extracted
+    previous_entries = {
+        directory: set(os.listdir(directory))
+        for directory in {archive_file.parent for archive_file in archive_files}
+    }
+    extracted_names: Dict[Path, Optional[Set[str]]] = {}
+    for archive_file in archive_files:
+        names = get_top_level_names(archive_file)
+        known_names = extracted_names.get(archive_file.parent, set())
+        if names is None or known_names is None:
+            extracted_names[archive_file.parent] = None
+        else:
+            extracted_names[archive_file.parent] = known_names | names
+    results = extract_all(archive_files, max_workers=args.jobs)
+    extracted_dirs: Set[Path] = set()
+    for archive_file, success in zip(archive_files, results):
+        if record_extraction(archive_file, success, args, conn):
+            extracted_dirs.add(archive_file.parent)
+    # Sorted paths keep the rescans of neighbouring directories together
+    with conn:
+        for directory in sorted(extracted_dirs):
+            update_index_after_extraction(
+                conn, directory, previous_entries[directory], extracted_names[directory]
             )
+
+
+def record_extraction(
+    archive_file: Path,
+    success: bool,
+    args,
+    conn,
+    previous_entries: Optional[Set[str]] = None,
+    extracted_names: Optional[Set[str]] = None,
+) -> bool:
+    """Logs an extraction, then updates the index and handles the archive.
+
+    Args:
+        archive_file (Path): The archive file that was extracted.
+        success (bool): Whether the extraction was successful.
+        args: Parsed command-line arguments.
+        conn: SQLite database connection.
+        previous_entries (Optional[Set[str]]): Names in the directory of the
+            archive before extraction, to rescan it with. If None, the rescan
+            is left to the caller; it also drops a deleted archive from the
+            index.
+        extracted_names (Optional[Set[str]]): Names the archive extracts into
+            its directory, or None if unknown.
+
+    Returns:
+        bool: True if the extraction was successful.
+    """
+    # Convert the path once for all the messages below
+    archive = str(archive_file)
+    # Skip building the messages of records that would be filtered out
+    log_info = logging.getLogger().isEnabledFor(logging.INFO)
+    if success:
+        if log_info:
+            logging.info({"action": "extract", "status": "success", "archive": archive})
+        # Prompt to delete the archive
+        delete_action = prompt_delete_action(archive_file, args.default_delete_choice)
+        # Record the extraction and the deletion in a single transaction
+        with conn:
+            if previous_entries is not None:
+                # Update index with new files/directories
+                update_index_after_extraction(
+                    conn, archive_file.parent, previous_entries, extracted_names
+                )
             if delete_action == "1":
-                delete_archive_file(archive_file, conn, args.dry_run)
+                delete_archive_file(
+                    archive_file,
+                    conn,
+                    args.dry_run,
+                    update_index=previous_entries is not None,
+                )
             else:
-                print(f"Keeping archive: {archive_file}")
-                logging.info({"action": "keep_archive", "archive": str(archive_file)})
-        else:
-            logging.error(
-                {"action": "extract", "status": "error", "archive": str(archive_file)}
-            )
+                print(f"Keeping archive: {archive}")
+                if log_info:
+                    logging.info({"action": "keep_archive", "archive": archive})
+    else:
+        logging.error({"action": "extract", "status": "error", "archive": archive})
+    return success
 
 
-def update_index_after_extraction(conn, directory: Path) -> None:
+def update_index_after_extraction(
+    conn,
+    directory: Path,
+    previous_entries: Set[str],
+    extracted_names: Optional[Set[str]],
+) -> None:
     """Updates the index after extraction of an archive.
 
+    The directory itself is rescanned one level deep, and only the
+    directories that the extraction created or extracted into are walked
+    recursively. Nothing is committed, so that the caller controls the
+    transaction.
+
     Args:
         conn: SQLite database connection.
         directory (Path): The directory where the archive was extracted.
+        previous_entries (Set[str]): Names in the directory before extraction.
+        extracted_names (Optional[Set[str]]): Names the archives extracted into
+            the directory, or None if unknown.
     """
-    # Re-scan the directory where the archive was extracted
-    collect_directories(conn, directory, recursive=False)
-
-
-def delete_archive_file(archive_file: Path, conn, dry_run: bool) -> None:
+    if extracted_names is None:
+        # Anything below the directory may have changed
+        refresh_directory(conn, directory, recursive=True)
+        return
+    refresh_directory(conn, directory, recursive=False)
+    with os.scandir(directory) as entries:
+        extracted_dirs = [
+            entry.path
+            for entry in entries
+            if (entry.name not in previous_entries or entry.name in extracted_names)
+            and entry.is_dir(follow_symlinks=False)
+        ]
+    for extracted_dir in extracted_dirs:
+        refresh_directory(conn, extracted_dir, recursive=True)
+
+
+def delete_archive_file(
+    archive_file: Path, conn, dry_run: bool, update_index: bool = True
+) -> None:
     """Deletes the archive file and updates the index.
 
+    The index update is not committed, so that the caller controls the
+    transaction.
+
     Args:
         archive_file (Path): The archive file to delete.
         conn: SQLite database connection.
         dry_run (bool): Whether to perform a dry run.
+        update_index (bool): Whether to remove the archive from the index, or
+            leave it to a later rescan of its directory.
     """
+    archive = str(archive_file)
     if dry_run:
-        print(f"Dry run: would delete archive: {archive_file}")
+        print(f"Dry run: would delete archive: {archive}")
         logging.info(
             {
                 "action": "delete_archive",
                 "status": "dry_run",
-                "archive": str(archive_file),
+                "archive": archive,
             }
         )
     else:
         try:
-            print(f"Deleting archive: {archive_file}")
-            archive_file.unlink()
-            logging.info(
-                {
-                    "action": "delete_archive",
-                    "status": "success",
-                    "archive": str(archive_file),
-                }
-            )
-            # Update index
-            update_index_after_change(conn, "delete_file", archive_file)
+            print(f"Deleting archive: {archive}")
+            os.unlink(archive)
+            if logging.getLogger().isEnabledFor(logging.INFO):
+                logging.info(
+                    {
+                        "action": "delete_archive",
+                        "status": "success",
+                        "archive": archive,
+                    }
+                )
+            if update_index:
+                update_index_after_changes(conn, [("delete_file", archive_file)])
         except Exception as e:
-            print(f"Error deleting archive {archive_file}: {e}")
+            print(f"Error deleting archive {archive}: {e}")
             logging.error(
                 {
                     "action": "delete_archive",
                     "status": "error",
-                    "archive": str(archive_file),
+                    "archive": archive,
                     "error": str(e),
                 }
             )